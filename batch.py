@@ -0,0 +1,165 @@
+"""
+Batch solving of many independent instances on a process pool
+
+Two modes, both streaming one JSON object per solved instance to a single output file:
+    python batch.py --instances DIRECTORY_OR_MANIFEST [--workers 4] [--output results.jsonl]
+        every file of the directory, or every file listed in the manifest (one path per line, "#" comments)
+    python batch.py --topology NETWORK_FILE --supplies SUPPLIES_CSV [--workers 4] [--output results.jsonl]
+        one network solved for every row of the supply table. The first CSV line holds "scenario" and
+        the node names, every other line a scenario name and the supply of every node (missing nodes: 0).
+The topology is loaded once by every worker when the pool starts, only the supply vectors are sent per task.
+With --cache DIRECTORY, the workers share an on-disk solution cache (see cache.SolutionCache): instances
+solved by an earlier batch are not solved again, and scenarios of the same topology start from the last
+solution (warm start).
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from array import array
+from cache import SolutionCache
+from network_io import read_network
+from residual import InfeasibleError, UnboundedError
+from solver import ALGORITHMS, AUTO, solve
+
+_topology = None #Network of the worker process in the topology mode
+_cache = None #Solution cache of the worker process, if any
+
+def instance_files(path):
+    """
+    Instance files of a directory (sorted), or the files listed in a manifest (relative to the manifest)
+    """
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if os.path.isfile(os.path.join(path, name))]
+    base = os.path.dirname(path)
+    files = []
+    f = open(path, 'r')
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                files.append(os.path.join(base, line))
+    finally:
+        f.close()
+    return files
+
+def read_supply_table(supplies_filename, network):
+    """
+    Scenarios of the supply table as (scenario name, supply of every node in network order)
+    """
+    f = open(supplies_filename, 'rb')
+    try:
+        rows = csv.reader(f)
+        header = next(rows)
+        columns = []
+        for name in header[1:]:
+            node = network.index.get(int(name))
+            if node is None:
+                raise ValueError('%s: unknown node %s' % (supplies_filename, name))
+            columns.append(node)
+        scenarios = []
+        for row in rows:
+            if not row:
+                continue
+            supplies = [0]*network.n
+            for node, value in zip(columns, row[1:]):
+                supplies[node] = int(value)
+            scenarios.append((row[0], supplies))
+    finally:
+        f.close()
+    return scenarios
+
+def result_record(instance, result):
+    record = {'instance':instance, 'algorithm':result.algorithm, 'cost':result.cost, 'flows':result.flows.tolist()}
+    record.update(result.stats)
+    return record
+
+def cached_solve(network, algorithm):
+    if _cache is None:
+        return solve(network, algorithm)
+    return _cache.solve(network, algorithm)
+
+def init_worker(topology_filename, cache_directory):
+    """
+    Worker initializer: load the shared topology (topology mode) and open the solution cache once per worker process
+    """
+    global _cache, _topology
+    if topology_filename is not None:
+        _topology = load_topology(topology_filename)
+    if cache_directory is not None:
+        _cache = SolutionCache(directory=cache_directory)
+
+def solve_file(task):
+    """
+    Worker: read and solve one instance file
+    """
+    filename, algorithm = task
+    try:
+        network, stats = read_network(filename)
+        return result_record(filename, cached_solve(network, algorithm))
+    except (IOError, ValueError, InfeasibleError, UnboundedError) as e:
+        return {'instance':filename, 'error':str(e)}
+
+def load_topology(topology_filename):
+    """
+    ResidualNetwork of the topology file, whose supplies every scenario replaces
+    """
+    network, stats = read_network(topology_filename)
+    return network
+
+def solve_scenario(task):
+    """
+    Worker: solve the topology with the supplies of one scenario
+    """
+    scenario, supplies, algorithm = task
+    _topology.supply = array('l', supplies)
+    try:
+        return result_record(scenario, cached_solve(_topology, algorithm))
+    except (ValueError, InfeasibleError, UnboundedError) as e:
+        return {'instance':scenario, 'error':str(e)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve many min-cost flow instances on a process pool')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--instances', help='Directory of instance files or manifest listing them')
+    source.add_argument('--topology', help='Network solved once per row of --supplies')
+    parser.add_argument('--supplies', help='CSV table of supply vectors for --topology')
+    parser.add_argument('--algorithm', default=AUTO, choices=sorted(ALGORITHMS) + [AUTO])
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output', default='batch_results.jsonl', help='JSON lines file the results are written to')
+    parser.add_argument('--cache', help='Directory of the solution cache shared by the workers')
+    args = parser.parse_args()
+    if args.topology and not args.supplies:
+        parser.error('--topology needs --supplies')
+
+    start = time.time()
+    if args.instances:
+        tasks = [(filename, args.algorithm) for filename in instance_files(args.instances)]
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(None, args.cache))
+        worker = solve_file
+    else:
+        network = load_topology(args.topology)
+        tasks = [(scenario, supplies, args.algorithm) for scenario, supplies in read_supply_table(args.supplies, network)]
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.topology, args.cache))
+        worker = solve_scenario
+
+    solved = failed = 0
+    f = open(args.output, 'w')
+    try:
+        for record in pool.imap_unordered(worker, tasks, chunksize=max(1, len(tasks)/(4*args.workers))):
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+            if 'error' in record:
+                failed += 1
+                print 'Instance %s failed: %s' % (record['instance'], record['error'])
+            else:
+                solved += 1
+    finally:
+        f.close()
+        pool.close()
+        pool.join()
+    print 'Solved %d instance(s), %d failed, in %.3f s' % (solved, failed, time.time() - start)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark of the min-cost flow solvers on seeded, generated instance families
+
+Every run solves one generated instance with one solver in a fresh worker process
+and appends one JSON object per line to the output file, e.g.
+    python benchmark.py --families grid random --sizes 100 400 --supplies 100 1000000 --output bench.jsonl
+Instance families (n nodes, m arcs, supplies up to U, costs in 0..C):
+    transportation - complete bipartite graph from n/2 supply nodes to n/2 demand nodes (m is ignored)
+    grid           - square grid with arcs in both directions between neighbours (m is ignored)
+    random         - random arcs on top of a directed cycle through all the nodes (m defaults to 4*n)
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import time
+from residual import ResidualNetwork
+from solver import ALGORITHMS, solve
+
+def random_supplies(rnd, n, sources, sinks, max_supply):
+    """
+    Supplies of n nodes: up to max_supply on every source node, the total split over the sink nodes
+    """
+    supplies = [0]*n
+    total = 0
+    for node in sources:
+        supplies[node] = rnd.randint(1, max_supply)
+        total += supplies[node]
+    cuts = sorted(rnd.randint(0, total) for i in xrange(len(sinks)-1))
+    for node, low, high in zip(sinks, [0] + cuts, cuts + [total]):
+        supplies[node] -= high - low
+    return supplies
+
+def transportation_network(n, m, max_supply, max_cost, seed):
+    rnd = random.Random(seed)
+    half = max(1, n/2)
+    sources, sinks = range(half), range(half, max(n, half+1))
+    tails, heads, costs = [], [], []
+    for source in sources:
+        for sink in sinks:
+            tails.append(source)
+            heads.append(sink)
+            costs.append(rnd.randint(0, max_cost))
+    supplies = random_supplies(rnd, len(sources) + len(sinks), sources, sinks, max_supply)
+    return ResidualNetwork(range(1, len(supplies)+1), supplies, tails, heads, costs)
+
+def grid_network(n, m, max_supply, max_cost, seed):
+    rnd = random.Random(seed)
+    side = max(2, int(round(n**0.5)))
+    tails, heads, costs = [], [], []
+    for row in xrange(side):
+        for col in xrange(side):
+            node = row*side + col
+            for other in ([node+1] if col+1 < side else []) + ([node+side] if row+1 < side else []):
+                for source, sink in ((node, other), (other, node)):
+                    tails.append(source)
+                    heads.append(sink)
+                    costs.append(rnd.randint(0, max_cost))
+    nodes = range(side*side)
+    rnd.shuffle(nodes)
+    count = max(1, len(nodes)/10)
+    supplies = random_supplies(rnd, len(nodes), nodes[:count], nodes[count:2*count], max_supply)
+    return ResidualNetwork(range(1, len(supplies)+1), supplies, tails, heads, costs)
+
+def random_network(n, m, max_supply, max_cost, seed):
+    rnd = random.Random(seed)
+    n = max(n, 2)
+    m = min(max(m or 4*n, n), n*(n-1))
+    arcs = set((node, (node+1) % n) for node in xrange(n)) #Cycle, so that every sink is reachable
+    while len(arcs) < m:
+        source, sink = rnd.randrange(n), rnd.randrange(n)
+        if source != sink:
+            arcs.add((source, sink))
+    arcs = sorted(arcs)
+    nodes = range(n)
+    rnd.shuffle(nodes)
+    count = max(1, n/4)
+    supplies = random_supplies(rnd, n, nodes[:count], nodes[count:2*count], max_supply)
+    return ResidualNetwork(range(1, n+1), supplies, [a[0] for a in arcs], [a[1] for a in arcs],
+                           [rnd.randint(0, max_cost) for a in arcs])
+
+FAMILIES = {
+    'transportation':transportation_network,
+    'grid':grid_network,
+    'random':random_network,
+}
+
+COUNTERS = ('phases', 'augmentations', 'shortest_paths', 'contractions', 'pushes', 'relabels', 'pivots') #Run statistics printed, if the solver has them
+
+def run(task):
+    """
+    Generate one instance and solve it (in a worker process)
+    """
+    network = FAMILIES[task['family']](task['n'], task['m'], task['max_supply'], task['max_cost'], task['seed'])
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = solve(network, task['solver'])
+    record = dict(task)
+    record.update(result.stats)
+    record.update({'nodes':network.n, 'arcs':network.m, 'cost':result.cost,
+                   'peak_rss_kb':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before, 'timestamp':time.time()})
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the min-cost flow solvers on generated instances')
+    parser.add_argument('--families', nargs='+', default=sorted(FAMILIES), choices=sorted(FAMILIES))
+    parser.add_argument('--solvers', nargs='+', default=sorted(ALGORITHMS), choices=sorted(ALGORITHMS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[50, 100, 200], help='Number of nodes n')
+    parser.add_argument('--arcs', type=int, default=None, help='Number of arcs m of the random family')
+    parser.add_argument('--supplies', nargs='+', type=int, default=[10, 1000, 10**6, 10**9], help='Maximum supply U')
+    parser.add_argument('--max-cost', type=int, default=100, help='Maximum arc cost C')
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--output', default='bench_results.jsonl', help='JSON lines file the results are appended to')
+    args = parser.parse_args()
+
+    tasks = []
+    for family in args.families:
+        for n in args.sizes:
+            for max_supply in args.supplies:
+                for seed in args.seeds:
+                    for solver in args.solvers:
+                        tasks.append({'family':family, 'n':n, 'm':args.arcs, 'max_supply':max_supply,
+                                      'max_cost':args.max_cost, 'seed':seed, 'solver':solver})
+
+    #One process per run, so that peak memory and allocator state do not carry over between runs
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    f = open(args.output, 'a')
+    try:
+        for record in pool.imap(run, tasks):
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+            f.flush()
+            counters = ''.join(', %d %s' % (record[key], key) for key in COUNTERS if key in record)
+            print '%(family)s n=%(nodes)d m=%(arcs)d U=%(max_supply)d %(solver)s: %(seconds).3f s' % record + \
+                  counters + ', cost %d' % record['cost']
+    finally:
+        f.close()
+        pool.close()
+        pool.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Content-addressed cache of optimal solutions
+
+    cache = SolutionCache(memory_entries=128, directory='./solution_cache', disk_bytes=256 << 20)
+    result = cache.solve(network, 'orlin')
+    print result.stats['cache'], cache.counters
+
+Networks are identified by a hash of their nodes (by name) and arcs (with costs, capacities and lower
+bounds), independent of the order they are listed in, and of their node supplies. A network seen before
+gets its stored flows and potentials back without solving; a network that only differs from a stored one
+by its supplies is solved from the stored flows and potentials (warm start). Entries are kept in memory
+(least recently used evicted first) and, if a directory is given, on disk up to a total size.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+import numpy
+from residual import ResidualNetwork, numpy_view
+from solver import AUTO, FlowResult, solve
+
+COUNTERS = ('hits', 'disk_hits', 'warm_starts', 'misses', 'evictions', 'disk_evictions')
+TRIM_TO = 0.75 #Share of disk_bytes left after trimming the disk tier, so that it is not trimmed at every store
+
+def canonical_keys(network):
+    """
+    Hash keys of a network and the order its nodes and arcs are stored in
+    @return (topology, key, nodes, arcs) - topology hashes the nodes and arcs, key the supplies as well;
+                                          nodes and arcs are the node and input arc indices in canonical order
+    """
+    nodes = numpy.array(sorted(xrange(network.n), key=lambda v: network.names[v]), dtype=numpy.int_)
+    rank = numpy.zeros(network.n, dtype=numpy.int_)
+    rank[nodes] = numpy.arange(network.n)
+    columns = [rank[numpy_view(network.tail)[0::2]], rank[numpy_view(network.head)[0::2]], numpy_view(network.cost)[0::2],
+               numpy_view(network.capacity), numpy_view(network.lower)]
+    arcs = numpy.lexsort(columns[::-1])
+    digest = hashlib.sha1(repr([network.names[v] for v in nodes]))
+    for column in columns:
+        digest.update(column[arcs].tostring())
+    topology = digest.hexdigest()
+    digest.update(numpy_view(network.supply)[nodes].tostring())
+    return topology, digest.hexdigest(), nodes, arcs
+
+class SolutionCache(object):
+    """
+    Optimal flows and potentials (in canonical order, see canonical_keys) of the networks solved through it,
+    in a memory tier and an optional disk tier
+    """
+
+    def __init__(self, memory_entries=128, directory=None, disk_bytes=256 << 20):
+        """
+        @param memory_entries - Number of solutions kept in memory
+        @param directory - Directory of the disk tier (created if needed), None for memory only
+        @param disk_bytes - Total size of the solution files: once the files written go above it, the least
+                            recently used ones are deleted down to TRIM_TO of it
+        """
+        self.memory_entries = memory_entries
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict() #key: (flows, potentials, algorithm that solved it), least recently used first
+        self.topologies = OrderedDict() #topology: key of its last solution
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.disk_total = 0 #Size of the solution files, as of the last scan plus the files written since
+        if directory is not None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.disk_total = sum(size for mtime, size, name in self.solution_files())
+
+    def path(self, name, extension):
+        return os.path.join(self.directory, name + extension)
+
+    def lookup(self, key):
+        """
+        Stored solution of key, from memory or from disk (it then moves to memory)
+        @return (entry, on_disk) - entry is None if there is none, on_disk tells if it was read from disk
+        """
+        entry = self.memory.pop(key, None)
+        if entry is not None:
+            self.memory[key] = entry
+            return entry, False
+        if self.directory is None:
+            return None, False
+        filename = self.path(key, '.npz')
+        try:
+            data = numpy.load(filename)
+            entry = (data['flows'], data['potentials'], str(data['algorithm']))
+            data.close()
+            os.utime(filename, None) #Recently used, see trim_disk
+        except (IOError, OSError, KeyError, ValueError):
+            return None, False
+        self.remember(key, entry)
+        return entry, True
+
+    def last_solution(self, topology):
+        """
+        Stored solution of the network with this topology solved last (any supplies), None if there is none
+        """
+        key = self.topologies.get(topology)
+        if key is None and self.directory is not None:
+            try:
+                f = open(self.path(topology, '.topology'), 'r')
+                try:
+                    key = f.read().strip()
+                finally:
+                    f.close()
+            except IOError:
+                return None
+        return self.lookup(key)[0] if key else None
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def store(self, topology, key, entry):
+        self.remember(key, entry)
+        self.topologies.pop(topology, None)
+        self.topologies[topology] = key
+        while len(self.topologies) > self.memory_entries:
+            self.topologies.popitem(last=False)
+        if self.directory is None:
+            return
+        #Written under a temporary name first, so that concurrent readers never see half a file
+        temporary = self.path('%s.%d' % (key, os.getpid()), '.tmp')
+        f = open(temporary, 'wb')
+        try:
+            numpy.savez(f, flows=entry[0], potentials=entry[1], algorithm=entry[2])
+        finally:
+            f.close()
+        filename = self.path(key, '.npz')
+        replaced = os.path.getsize(filename) if os.path.exists(filename) else 0
+        os.rename(temporary, filename)
+        self.disk_total += os.path.getsize(filename) - replaced
+        f = open(temporary, 'w')
+        try:
+            f.write(key)
+        finally:
+            f.close()
+        os.rename(temporary, self.path(topology, '.topology'))
+        if self.disk_total > self.disk_bytes:
+            self.trim_disk()
+
+    def solution_files(self):
+        """
+        (mtime, size, name) of every solution file of the disk tier
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                try:
+                    info = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                files.append((info.st_mtime, info.st_size, name))
+        return files
+
+    def trim_disk(self):
+        """
+        Delete the least recently used solution files until the disk tier fits in TRIM_TO of disk_bytes,
+        and the topology files of the deleted solutions. The directory is only scanned here (other processes
+        may write to it too), not at every store.
+        """
+        files = sorted(self.solution_files())
+        total = sum(size for mtime, size, name in files)
+        evicted = set()
+        for mtime, size, name in files:
+            if total <= TRIM_TO*self.disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            self.counters['disk_evictions'] += 1
+            evicted.add(name[:-len('.npz')])
+        self.disk_total = total
+        for name in (os.listdir(self.directory) if evicted else ()):
+            if name.endswith('.topology'):
+                try:
+                    f = open(os.path.join(self.directory, name), 'r')
+                    try:
+                        key = f.read().strip()
+                    finally:
+                        f.close()
+                    if key in evicted:
+                        os.remove(os.path.join(self.directory, name))
+                except (IOError, OSError):
+                    continue
+
+    def solve(self, network, algorithm=AUTO, verbose=False):
+        """
+        solver.solve through the cache. result.stats['cache'] tells how the result was found:
+        'hit' (stored solution, result.algorithm is then the one that solved it), 'warm' (solved from the stored
+        solution of other supplies) or 'miss'
+        @param network - ResidualNetwork (its flow and potentials are overwritten) or input graph
+        """
+        start = time.time()
+        if not isinstance(network, ResidualNetwork):
+            network = ResidualNetwork.from_graph(network)
+        topology, key, nodes, arcs = canonical_keys(network)
+        entry, on_disk = self.lookup(key)
+        if entry is not None:
+            self.counters['hits'] += 1
+            if on_disk:
+                self.counters['disk_hits'] += 1
+            network.reset()
+            network.set_flows(nodes, arcs, entry[0], entry[1])
+            return FlowResult(network, entry[2], {'cache':'hit', 'seconds':time.time() - start})
+
+        entry = self.last_solution(topology)
+        if entry is not None:
+            #Same arcs, other supplies: the stored potentials are still optimal for the stored flows
+            self.counters['warm_starts'] += 1
+            network.reset()
+            network.set_flows(nodes, arcs, entry[0], entry[1])
+            result = solve(network, algorithm, verbose, warm_start=True)
+            result.stats['cache'] = 'warm'
+        else:
+            self.counters['misses'] += 1
+            result = solve(network, algorithm, verbose)
+            result.stats['cache'] = 'miss'
+        self.store(topology, key, (numpy_view(result.flows)[arcs].copy(), numpy_view(result.potentials)[nodes].copy(),
+                                   result.algorithm))
+        result.stats['seconds'] = time.time() - start
+        return result
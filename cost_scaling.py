@@ -0,0 +1,244 @@
+"""
+Goldberg-Tarjan cost scaling (push-relabel) on the array-backed residual network
+
+Every phase (refine) turns the flow into an epsilon-optimal flow, with epsilon divided by SCALE_FACTOR
+from phase to phase. Arc costs are multiplied by n+1, so that the flow of the phase with epsilon 1 is optimal.
+Active nodes are discharged in FIFO order. Heuristics:
+    global update     - potentials from shortest distances to the deficit nodes, at the start of
+                        every phase and after every n relabels
+    price refinement  - a phase is skipped if potentials making the flow epsilon-optimal already exist
+"""
+import heapq
+import logging
+from array import array
+from collections import deque
+import numpy
+from residual import InfeasibleError, MAX_INT, log, log_enabled, numpy_view
+from network_io import read_network, display_load_info
+
+SCALE_FACTOR = 16
+
+def global_update(eps, excess, potential, head, cost, residual, first_arc, adjacent_arcs):
+    """
+    Raise the potentials of the nodes far from any deficit node, keeping the flow epsilon-optimal.
+    Distances to the deficit nodes are measured in units of eps (arc length rc/eps + 1) and only
+    computed until every node with an excess is reached.
+    """
+    n = len(excess)
+    dist = [None]*n
+    settled = [False]*n
+    heap = []
+    active = 0
+    for v in xrange(n):
+        if excess[v] < 0:
+            dist[v] = 0
+            heap.append((0, v))
+        elif excess[v] > 0:
+            active += 1
+    order = []
+    level = 0
+    while heap and active > 0:
+        level, w = heapq.heappop(heap)
+        if settled[w]:
+            continue
+        settled[w] = True
+        order.append(w)
+        if excess[w] > 0:
+            active -= 1
+        pw = potential[w]
+        for idx in xrange(first_arc[w], first_arc[w+1]):
+            a = adjacent_arcs[idx] ^ 1 #Residual arc from the neighbour into w
+            if residual[a] <= 0:
+                continue
+            u = head[a^1]
+            if settled[u]:
+                continue
+            nd = level + (cost[a] - potential[u] + pw)//eps + 1
+            if dist[u] is None or nd < dist[u]:
+                dist[u] = nd
+                heapq.heappush(heap, (nd, u))
+    if active > 0:
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+    #Every node beyond level is raised by level*eps, which is the same as lowering the settled ones
+    for v in order:
+        potential[v] -= (level - dist[v])*eps
+
+def price_refinement(eps, potential, head, cost, residual, first_arc, adjacent_arcs):
+    """
+    Look for potentials making the current flow epsilon-optimal (shortest paths with arc lengths rc + eps,
+    given up after a few passes over the nodes) and apply them
+    @return True if the potentials were found
+    """
+    n = len(potential)
+    dist = [0]*n
+    in_queue = [True]*n
+    queue = deque(xrange(n))
+    limit = 4*n
+    while queue:
+        limit -= 1
+        if limit < 0:
+            return False
+        u = queue.popleft()
+        in_queue[u] = False
+        du = dist[u]
+        pu = potential[u]
+        for idx in xrange(first_arc[u], first_arc[u+1]):
+            a = adjacent_arcs[idx]
+            if residual[a] <= 0:
+                continue
+            v = head[a]
+            nd = du + cost[a] - pu + potential[v] + eps
+            if nd < dist[v]:
+                dist[v] = nd
+                if not in_queue[v]:
+                    queue.append(v)
+                    in_queue[v] = True
+    for v in xrange(n):
+        potential[v] -= dist[v]
+    return True
+
+def cost_scaling_array(network, log_level=None, warm_start=False):
+    """
+    Cost scaling push-relabel algorithm on the array-backed residual network
+    @param log_level - Lowest level of the messages to log (phases are logged at INFO, flows at DEBUG), None for no logging
+    @param warm_start - Continue from the current flow and potentials of the network (see ResidualNetwork.repair_potentials)
+                        with a single phase of epsilon 1
+    @return Run statistics: number of phases, skipped phases, pushes, relabels and global updates
+    """
+    if warm_start:
+        network.expand()
+    else:
+        network.reset()
+    log_phases = log_enabled(log_level, logging.INFO)
+    log_flows = log_enabled(log_level, logging.DEBUG)
+    if not warm_start:
+        network.initialize_potentials() #Also detects negative cycles of uncapacitated arcs
+    n, m = network.n, network.m
+    stats = {'phases':0, 'skipped_phases':0, 'pushes':0, 'relabels':0, 'global_updates':0}
+    if n == 0:
+        return stats
+
+    #Local lists of the network vectors, costs and potentials multiplied by n+1
+    alpha = n + 1
+    head = network.head.tolist()
+    first_arc, adjacent_arcs = network.first_arc.tolist(), network.adjacent_arcs.tolist()
+    cost = (numpy_view(network.cost)*alpha).tolist()
+    potential = (numpy_view(network.potential)*alpha).tolist()
+    excess = network.excess.tolist()
+    residual = network.residual.tolist()
+
+    #Uncapacitated arcs get a capacity above any flow they need, so that they can be saturated
+    capacity = numpy_view(network.capacity)
+    uncapacitated = numpy.flatnonzero(capacity == MAX_INT)
+    flows = numpy_view(network.residual)[1::2]
+    bound = 1 + sum(e for e in excess if e > 0) + int((capacity - numpy_view(network.lower))[capacity != MAX_INT].sum()) + \
+            (int(flows[uncapacitated].max()) if len(uncapacitated) else 0)
+    for i in uncapacitated:
+        residual[2*i] = bound - residual[2*i+1]
+
+    eps = 1 if warm_start else max([1] + [abs(c) for c in cost])
+    while True:
+        eps = max(1, eps/SCALE_FACTOR)
+        if not any(excess) and price_refinement(eps, potential, head, cost, residual, first_arc, adjacent_arcs):
+            stats['skipped_phases'] += 1
+            if eps == 1:
+                break
+            continue
+        if log_phases:
+            log.info('--cost scaling phase with epsilon value = %s--', eps)
+        stats['phases'] += 1
+
+        #Saturate every residual arc with a negative reduced cost
+        for a in xrange(2*m):
+            r = residual[a]
+            if r > 0 and cost[a] - potential[head[a^1]] + potential[head[a]] < 0:
+                residual[a] = 0
+                residual[a^1] += r
+                excess[head[a^1]] -= r
+                excess[head[a]] += r
+
+        global_update(eps, excess, potential, head, cost, residual, first_arc, adjacent_arcs)
+        stats['global_updates'] += 1
+        active = deque(v for v in xrange(n) if excess[v] > 0)
+        current = first_arc[:n]
+        relabels = 0
+
+        #Discharge the active nodes in FIFO order
+        while active:
+            v = active.popleft()
+            e = excess[v]
+            pv = potential[v]
+            idx, end = current[v], first_arc[v+1]
+            while e > 0:
+                if idx == end:
+                    #Relabel: lower the reduced costs of the arcs leaving v until one is admissible
+                    best = None
+                    for jdx in xrange(first_arc[v], end):
+                        a = adjacent_arcs[jdx]
+                        if residual[a] > 0:
+                            value = cost[a] + potential[head[a]]
+                            if best is None or value < best:
+                                best = value
+                    if best is None:
+                        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+                    pv = potential[v] = best + eps
+                    idx = first_arc[v]
+                    stats['relabels'] += 1
+                    relabels += 1
+                    if relabels >= n:
+                        excess[v] = e
+                        global_update(eps, excess, potential, head, cost, residual, first_arc, adjacent_arcs)
+                        stats['global_updates'] += 1
+                        current = first_arc[:n]
+                        relabels = 0
+                        pv = potential[v]
+                    continue
+                a = adjacent_arcs[idx]
+                r = residual[a]
+                if r > 0:
+                    w = head[a]
+                    if cost[a] - pv + potential[w] < 0:
+                        delta = e if e < r else r
+                        residual[a] = r - delta
+                        residual[a^1] += delta
+                        e -= delta
+                        if excess[w] <= 0 < excess[w] + delta:
+                            active.append(w)
+                        excess[w] += delta
+                        stats['pushes'] += 1
+                        if log_flows:
+                            log.debug('Flow from %s to %s %s unit(s)', network.names[v], network.names[w], delta)
+                        if delta < r:
+                            continue
+                idx += 1
+            current[v] = idx
+            excess[v] = e
+        if eps == 1:
+            break
+    if any(excess):
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+
+    #Back to the network: real capacities of the uncapacitated arcs and potentials in cost units
+    for i in uncapacitated:
+        residual[2*i] = MAX_INT - network.lower[i] - residual[2*i+1]
+    network.residual[:] = array('l', residual)
+    network.excess[:] = array('l', excess)
+    network.potential[:] = array('l', [p//alpha for p in potential])
+    network.correct_potentials() #Rounding the potentials can leave reduced costs of -1
+    return stats
+
+def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
+    fn = raw_input('Input filename:')
+    try:
+        network, stats = read_network(fn)
+        display_load_info(stats)
+        cost_scaling_array(network, logging.INFO)
+        print 'Total cost: %s' % network.total_cost()
+    except IOError:
+        print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
-import networkx as nx
-from numpy import log2
+import logging
 import random
 import sys
+from residual import ResidualNetwork, ExcessBuckets, InfeasibleError, log, log_enabled, augment_shortest_path_forest, \
+                     round_to_feasible
+from network_io import read_network, display_load_info, graph_from_network
 
 MAX_INT = sys.maxint
 
@@ -11,6 +13,11 @@ EXCESS = 'excess'
 POTENTIAL = 'node_potential'
 FLOW = 'pseudoflow'
 CAPACITY = 'capacity'
+LOWER = 'lower_bound'
+
+ENGINE_ARRAY = 'array'
+ENGINE_NETWORKX = 'networkx'
+ENGINES = (ENGINE_ARRAY, ENGINE_NETWORKX)
 
 _cost = 0
 
@@ -18,34 +25,9 @@ def get_graph_from_input(input_filename):
     """
     Get the graph data from input file
     """
-    f = open(input_filename, 'r')
-    lines  = f.readlines()
-    f.close()
-    node_remember = set()
-    nodes = []
-    edges = []
-    for line in lines:
-        if line.startswith('##') or not line.strip():
-            continue
-        parts = line.split(',')
-        source_info = parts[0].split('|')
-        dest_info = parts[1].split('|')
-        source_node = int(source_info[0])
-        source_amount = int(source_info[1])
-        dest_node = int(dest_info[0])
-        dest_amount = int(dest_info[1])
-        cost = int(parts[2])
-        if source_node not in node_remember:
-            nodes.append((source_node, {UNITS:source_amount}))
-            node_remember.add(source_node)
-        if dest_node not in node_remember:
-            nodes.append((dest_node, {UNITS:dest_amount}))
-            node_remember.add(dest_node)        
-        edges.append((source_node, dest_node, {COST:cost}))
-    dgraph = nx.DiGraph()
-    dgraph.add_nodes_from(nodes)
-    dgraph.add_edges_from(edges)
-    return dgraph
+    network, stats = read_network(input_filename)
+    display_load_info(stats)
+    return graph_from_network(network)
 
 def calculate_cost(graph, og):
     global _cost
@@ -95,10 +77,25 @@ def display_graph_info(graph, attr_nodelbl, attr_edgelb):
             data = eattr[attr_edgelb]
             print('(%d(%d), %d, %.3f)' % (n,graph.node[n][attr_nodelbl],nbr,data))
 
-def rhs_scaling(graph):
+def rhs_scaling(graph, engine=ENGINE_ARRAY):
     """
     Edmond-Karp scaling algorithm implementation
+    @return Total cost of the flow
+    @param graph - Input graph (or a ResidualNetwork, see read_network, for ENGINE_ARRAY)
+    @param engine - ENGINE_ARRAY (array-backed residual network) or ENGINE_NETWORKX (attributes of the DiGraph)
     """
+    if engine == ENGINE_ARRAY:
+        network = graph if isinstance(graph, ResidualNetwork) else ResidualNetwork.from_graph(graph)
+        rhs_scaling_array(network, logging.DEBUG)
+        print ''
+        print 'Displaying the resulting graph after flows.'
+        display_graph_info(network.to_graph(),EXCESS,FLOW) #Display for debug
+        return network.total_cost()
+    if engine != ENGINE_NETWORKX:
+        raise ValueError('Unknown engine: %s' % engine)
+    import networkx as nx #Only the NetworkX engine needs it, not imported for the array engine
+    if any(CAPACITY in data or LOWER in data for source,sink,data in graph.edges_iter(data=True)):
+        raise ValueError('The %s engine only solves uncapacitated networks' % ENGINE_NETWORKX)
 
     #Initialization of x, PI, e, U and delta
     egraph = graph.copy()
@@ -181,16 +178,105 @@ def rhs_scaling(graph):
     print 'Displaying the resulting graph after flows.'
     display_graph_info(egraph,EXCESS,FLOW) #Display for debug
     calculate_cost(egraph, graph)
+    return _cost
+
+def rhs_scaling_array(network, log_level=None, warm_start=False, profiler=None, budget=None):
+    """
+    Edmond-Karp scaling algorithm on the array-backed residual network
+    @param log_level - Lowest level of the messages to log (phases are logged at INFO, flows at DEBUG), None for no logging
+    @param warm_start - Continue from the current flow and potentials of the network (see ResidualNetwork.repair_potentials)
+                        instead of zero flow, delta then starts from the largest node imbalance
+    @param profiler - profiling.PhaseProfiler given a record of every delta phase, None for no profiling
+    @param budget - residual.Budget checked after every delta phase, None to run until the flow is optimal
+    @return Run statistics: number of delta phases, augmentations, shortest path computations and contractions.
+            With a budget, whether it stopped the scaling early, and then the dual bound of the potentials
+            at the stop and the augmentations of the rounding to a feasible flow
+    """
+
+    if budget is not None:
+        budget.start()
+
+    #Initialization of x, PI, e, U and delta
+    if warm_start:
+        network.expand()
+    else:
+        network.reset()
+    log_phases = log_enabled(log_level, logging.INFO)
+    log_flows = log_enabled(log_level, logging.DEBUG)
+    if not warm_start:
+        network.initialize_potentials() #Only needed with negative arc costs
+    buckets = ExcessBuckets(network, 1) #Source and sink nodes, kept up to date for the whole run
+    delta = buckets.largest() #maximum node imbalance, rounded down to a power of two
+
+    #Warm started flows and arc capacities are not multiples of delta: their paths may use any arc with
+    #residual capacity, so that no arc below delta is left with a negative reduced cost
+    path_delta = 1 if warm_start or network.capacitated() else None
+
+    stats = {'phases':0, 'augmentations':0, 'shortest_paths':0, 'contractions':0}
+    stopped = False
+
+    #Delta scaling phase begins
+    while delta > 0 and not buckets.balanced():
+        #A phase without a delta-source or without a delta-sink sends nothing, skip to the next one with both
+        delta = min(delta, buckets.largest(1), buckets.largest(-1))
+        if delta == 0:
+            break
+        if log_phases:
+            log.info('--delta scaling phase with delta value = %s--', delta)
+        stats['phases'] += 1
+        buckets.set_delta(delta)
+        S, T = buckets.sources, buckets.sinks
+        profile = None
+        if profiler is not None:
+            profile = profiler.start_phase('rhs', delta)
+            profile['sources'], profile['sinks'] = len(S), len(T)
+
+        #Shortest paths from all the sources at once, then delta units to every reachable sink
+        while len(S) > 0 and len(T) > 0:
+            augmentations = augment_shortest_path_forest(network, buckets, S, T, delta, path_delta, log_flows, profile)
+            if augmentations == 0:
+                break
+            stats['augmentations'] += augmentations
+            stats['shortest_paths'] += 1
+        if profiler is not None:
+            profiler.end_phase(profile)
+
+        #Update delta
+        delta /= 2
+        if budget is not None and delta > 0 and not buckets.balanced() and budget.exhausted(stats['phases']):
+            stopped = True
+            break
+
+    if budget is not None:
+        stats['stopped'] = stopped
+    if stopped:
+        #Anytime solve: the potentials bound the optimal cost, the remaining excess goes to the deficits unscaled
+        stats['dual_bound'] = network.dual_bound()
+        stats['rounding_augmentations'] = round_to_feasible(network, buckets, log_flows)
+    if not buckets.balanced():
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+    return stats
 
 def main():
+    engine = sys.argv[1] if len(sys.argv) > 1 else ENGINE_ARRAY
+    if engine not in ENGINES:
+        print 'Usage: %s [%s]' % (sys.argv[0], '|'.join(ENGINES))
+        return
+    logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
     fn = raw_input('Input filename:')
     try:
-        dgraph = get_graph_from_input(fn)
-        rhs_scaling(dgraph)
+        if engine == ENGINE_ARRAY:
+            network, stats = read_network(fn)
+            display_load_info(stats)
+            cost = rhs_scaling(network, engine)
+        else:
+            cost = rhs_scaling(get_graph_from_input(fn), engine)
         print ''
-        print 'Total Cost: ' + str(_cost)
+        print 'Total Cost: ' + str(cost)
     except IOError:
         print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,381 @@
+"""
+Readers for network files, building the array-backed residual network directly
+
+Input data format (lines started with "##" are comments):
+    SOURCE_NODE_NAME|SOURCE_NODE_AMOUNT, DEST_NODE_NAME|DEST_NODE_AMOUNT, COST[, CAPACITY[, LOWER_BOUND]]
+Arcs without a capacity are uncapacitated, arcs without a lower bound have lower bound 0.
+
+DIMACS min-cost flow format (see read_dimacs_network):
+    c COMMENT
+    p min NODES ARCS
+    n NODE_ID SUPPLY
+    a SOURCE_NODE_ID DEST_NODE_ID LOWER_BOUND CAPACITY COST
+
+Binary format (little-endian, see write_binary_network):
+    header  - magic, flags, n, m (32 bytes)
+    columns - int64 node names[n], supplies[n], arc tails[m], heads[m], costs[m]
+              (then capacities[m] and lower bounds[m] if flagged)
+Arc tails and heads are node indices. The columns are fixed width, so they are memory-mapped and copied into
+the network arrays with plain memory copies instead of being parsed. The network keeps private copies (its
+solvers index the arrays one element at a time, which numpy views would slow down), so loading is fast but
+the memory is not shared between processes loading the same file.
+"""
+import numpy
+from array import array
+import gzip
+import struct
+import sys
+import time
+from residual import ResidualNetwork, MAX_INT, UNITS, COST, CAPACITY, LOWER
+
+GZIP_MAGIC = '\x1f\x8b'
+BINARY_MAGIC = 'MCFB'
+BINARY_HEADER = struct.Struct('<4sIqq8x')
+BINARY_DTYPE = numpy.dtype('<i8')
+FLAG_CAPACITIES = 1
+FLAG_LOWER_BOUNDS = 2
+LINE_FORMAT = '"SOURCE|AMOUNT, DEST|AMOUNT, COST[, CAPACITY[, LOWER_BOUND]]"'
+
+def open_input(input_filename):
+    """
+    Open an input file for reading lines, gzip compressed files are detected by their magic number
+    """
+    f = open(input_filename, 'rb')
+    magic = f.read(2)
+    f.close()
+    if magic == GZIP_MAGIC:
+        return gzip.open(input_filename, 'rb')
+    return open(input_filename, 'r')
+
+class NetworkBuilder(object):
+    """
+    Collect node supplies and arcs into flat arrays while a file is parsed
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+        self.supplies = array('l')
+        self.tails = array('l')
+        self.heads = array('l')
+        self.costs = array('l')
+        self.capacities = None #Only created for the first arc with a capacity
+        self.lowers = None
+
+    def node(self, name, supply, line_number):
+        """
+        Index of the node, registering it on first sight and checking its supply afterwards
+        """
+        idx = self.index.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.index[name] = idx
+            self.names.append(name)
+            self.supplies.append(supply)
+        elif self.supplies[idx] != supply:
+            raise ValueError('Line %d: node %s has supply %d, but %d before' % (line_number, name, supply, self.supplies[idx]))
+        return idx
+
+    def arc(self, source, sink, cost):
+        self.tails.append(source)
+        self.heads.append(sink)
+        self.costs.append(cost)
+
+    def bounds(self, i, capacity, lower):
+        """
+        Set the capacity and lower bound of arc i, the arcs before it without bounds are filled in
+        """
+        if self.capacities is None:
+            self.capacities, self.lowers = array('l'), array('l')
+        self.pad(i)
+        self.capacities.append(capacity)
+        self.lowers.append(lower)
+
+    def pad(self, m):
+        """
+        Default capacity and lower bound for the arcs up to m without bounds
+        """
+        missing = m - len(self.capacities)
+        if missing > 0:
+            self.capacities.extend(array('l', [MAX_INT]) * missing)
+            self.lowers.extend(array('l', [0]) * missing)
+
+    def build(self):
+        if self.capacities is not None:
+            self.pad(len(self.costs))
+        return ResidualNetwork(self.names, self.supplies, self.tails, self.heads, self.costs, self.capacities, self.lowers)
+
+def read_network(input_filename):
+    """
+    Stream the input file line by line into a ResidualNetwork (binary files are memory-mapped instead)
+    @return (network, stats) - stats holds the number of lines and arcs, the bytes read, the parse time and
+                               whether the network is a transportation instance (see ResidualNetwork.is_transportation)
+    """
+    if is_binary_network(input_filename):
+        return read_binary_network(input_filename)
+    if is_dimacs_network(input_filename):
+        return read_dimacs_network(input_filename)
+    start = time.time()
+    builder = NetworkBuilder()
+    line_number = 0
+    size = 0
+    f = open_input(input_filename)
+    #Local names for the per line work, builder.node is only called for new or inconsistent nodes
+    index, supplies = builder.index, builder.supplies
+    tails, heads, costs = builder.tails, builder.heads, builder.costs
+    try:
+        for line in f:
+            line_number += 1
+            size += len(line)
+            if line.startswith('##') or not line.strip():
+                continue
+            #',' separates the fields and '|' only the name and amount of the two nodes: a field with the wrong
+            #number of '|' fails to unpack or to convert to int
+            fields = line.split(',')
+            count = len(fields)
+            try:
+                if count < 3 or count > 5:
+                    raise ValueError
+                source_name, source_amount = fields[0].split('|')
+                sink_name, sink_amount = fields[1].split('|')
+                source_name, source_amount = int(source_name), int(source_amount)
+                sink_name, sink_amount = int(sink_name), int(sink_amount)
+                cost = int(fields[2])
+                if count > 3:
+                    capacity, lower = int(fields[3]), int(fields[4]) if count > 4 else 0
+            except ValueError:
+                raise ValueError('Line %d: expected %s' % (line_number, LINE_FORMAT))
+            source = index.get(source_name)
+            if source is None or supplies[source] != source_amount:
+                source = builder.node(source_name, source_amount, line_number)
+            sink = index.get(sink_name)
+            if sink is None or supplies[sink] != sink_amount:
+                sink = builder.node(sink_name, sink_amount, line_number)
+            tails.append(source)
+            heads.append(sink)
+            costs.append(cost)
+            if count > 3:
+                builder.bounds(len(costs) - 1, capacity, lower)
+    finally:
+        f.close()
+    network = builder.build()
+    stats = {'lines':line_number, 'nodes':network.n, 'arcs':network.m, 'bytes':size, 'seconds':time.time() - start,
+             'transportation':network.is_transportation()}
+    return network, stats
+
+def display_load_info(stats):
+    """
+    Print the parse throughput of read_network, and whether the network is a transportation instance
+    """
+    seconds = max(stats['seconds'], 1e-9)
+    print 'INFO: Loaded %d nodes and %d arcs in %.3f s (%.0f arcs/s, %.1f MB/s)' % (stats['nodes'], stats['arcs'], stats['seconds'],
+                                                                                   stats['arcs']/seconds, stats['bytes']/seconds/1e6)
+    if stats.get('transportation'):
+        print 'INFO: Transportation instance (supply nodes joined straight to demand nodes), solved by the ' \
+              'transportation simplex with solver.solve(network, algorithm=\'auto\')'
+
+def graph_from_network(network):
+    """
+    Input graph (node UNITS and arc COST attributes) of a network, for the NetworkX engine
+    """
+    import networkx as nx #Not imported before a graph is needed, see residual.py
+    dgraph = nx.DiGraph()
+    for v in xrange(network.n):
+        dgraph.add_node(network.names[v], {UNITS:network.supply[v]})
+    for i in xrange(network.m):
+        data = {COST:network.cost[2*i]}
+        if network.capacity[i] != MAX_INT:
+            data[CAPACITY] = network.capacity[i]
+        if network.lower[i] != 0:
+            data[LOWER] = network.lower[i]
+        dgraph.add_edge(network.names[network.tail[2*i]], network.names[network.head[2*i]], data)
+    return dgraph
+
+def is_dimacs_network(input_filename):
+    """
+    Check if the first line that is not blank starts with a DIMACS comment or problem line
+    """
+    f = open_input(input_filename)
+    try:
+        for line in f:
+            if line.strip():
+                return line.split(None, 1)[0] in ('c', 'p')
+    finally:
+        f.close()
+    return False
+
+def read_dimacs_network(input_filename):
+    """
+    Stream a DIMACS min-cost flow file into a ResidualNetwork, node IDs 1..NODES are the node names
+    @return (network, stats) - See read_network
+    """
+    start = time.time()
+    n = None
+    supplies = None
+    tails, heads, costs = array('l'), array('l'), array('l')
+    capacities, lowers = array('l'), array('l')
+    line_number = 0
+    size = 0
+    f = open_input(input_filename)
+    try:
+        for line in f:
+            line_number += 1
+            size += len(line)
+            parts = line.split()
+            if not parts or parts[0] == 'c':
+                continue
+            kind = parts[0]
+            try:
+                if kind == 'a' and n is not None:
+                    source, sink = int(parts[1]) - 1, int(parts[2]) - 1
+                    if not (0 <= source < n and 0 <= sink < n):
+                        raise ValueError('Line %d: arc endpoint out of range' % line_number)
+                    tails.append(source)
+                    heads.append(sink)
+                    lowers.append(int(parts[3]))
+                    capacities.append(int(parts[4]))
+                    costs.append(int(parts[5]))
+                elif kind == 'n' and n is not None:
+                    node = int(parts[1]) - 1
+                    if not 0 <= node < n:
+                        raise ValueError('Line %d: node out of range' % line_number)
+                    supplies[node] = int(parts[2])
+                elif kind == 'p' and n is None:
+                    if parts[1] != 'min':
+                        raise ValueError('Line %d: not a min-cost flow problem' % line_number)
+                    n = int(parts[2])
+                    supplies = array('l', [0]) * n
+                else:
+                    raise ValueError('Line %d: unexpected "%s" line' % (line_number, kind))
+            except IndexError:
+                raise ValueError('Line %d: missing field' % line_number)
+    finally:
+        f.close()
+    if n is None:
+        raise ValueError('Missing "p min" problem line')
+    network = ResidualNetwork(range(1, n+1), supplies, tails, heads, costs, capacities, lowers)
+    stats = {'lines':line_number, 'nodes':network.n, 'arcs':network.m, 'bytes':size, 'seconds':time.time() - start,
+             'transportation':network.is_transportation()}
+    return network, stats
+
+def write_dimacs_solution(network, output_filename):
+    """
+    Write the total cost and the flow of every arc with a non-zero flow in the DIMACS solution format
+    """
+    f = open(output_filename, 'w')
+    try:
+        f.write('c Min-cost flow solution\n')
+        f.write('s %d\n' % network.total_cost())
+        for i in xrange(network.m):
+            flow = network.flow(i)
+            if flow:
+                f.write('f %s %s %d\n' % (network.names[network.tail[2*i]], network.names[network.head[2*i]], flow))
+    finally:
+        f.close()
+
+def is_binary_network(input_filename):
+    """
+    Check the magic number of a file for the binary network format
+    """
+    f = open(input_filename, 'rb')
+    magic = f.read(len(BINARY_MAGIC))
+    f.close()
+    return magic == BINARY_MAGIC
+
+def write_binary_network(network, output_filename):
+    """
+    Write the nodes and input arcs of a network in the binary format
+    """
+    flags = 0
+    if network.capacitated():
+        flags |= FLAG_CAPACITIES
+    if any(network.lower):
+        flags |= FLAG_LOWER_BOUNDS
+    f = open(output_filename, 'wb')
+    try:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, flags, network.n, network.m))
+        columns = [network.names, network.supply, network.tail[0::2], network.head[0::2], network.cost[0::2]]
+        if flags & FLAG_CAPACITIES:
+            columns.append(network.capacity)
+        if flags & FLAG_LOWER_BOUNDS:
+            columns.append(network.lower)
+        for column in columns:
+            numpy.asarray(column, dtype=BINARY_DTYPE).tofile(f)
+    finally:
+        f.close()
+
+def map_binary_network(input_filename):
+    """
+    Memory-map the columns of a binary network file (read only)
+    @return (n, m, columns) - columns maps 'names', 'supplies', 'tails', 'heads', 'costs' (and 'capacities', 'lowers')
+                              to numpy.memmap
+    """
+    f = open(input_filename, 'rb')
+    header = f.read(BINARY_HEADER.size)
+    f.close()
+    if len(header) < BINARY_HEADER.size:
+        raise ValueError('%s: truncated binary network header' % input_filename)
+    magic, flags, n, m = BINARY_HEADER.unpack(header)
+    if magic != BINARY_MAGIC:
+        raise ValueError('%s: not a binary network file' % input_filename)
+    layout = [('names', n), ('supplies', n), ('tails', m), ('heads', m), ('costs', m)]
+    if flags & FLAG_CAPACITIES:
+        layout.append(('capacities', m))
+    if flags & FLAG_LOWER_BOUNDS:
+        layout.append(('lowers', m))
+    columns = {}
+    offset = BINARY_HEADER.size
+    for name, size in layout:
+        columns[name] = numpy.memmap(input_filename, dtype=BINARY_DTYPE, mode='r', offset=offset, shape=(size,)) if size > 0 \
+                        else numpy.zeros(0, dtype=BINARY_DTYPE)
+        offset += size*BINARY_DTYPE.itemsize
+    return n, m, columns
+
+def column_array(column):
+    """
+    Copy a mapped int64 column into an array, as a plain memory copy when the native long matches
+    """
+    values = array('l')
+    if values.itemsize == BINARY_DTYPE.itemsize and sys.byteorder == 'little':
+        values.fromstring(buffer(column))
+    else:
+        values.extend(column.tolist())
+    return values
+
+def read_binary_network(input_filename):
+    """
+    Load a ResidualNetwork from a binary network file, see read_network. The mapped columns are copied into
+    the arrays of the network, the file is not used any more once it is loaded.
+    """
+    start = time.time()
+    n, m, columns = map_binary_network(input_filename)
+    capacities = column_array(columns['capacities']) if 'capacities' in columns else None
+    lowers = column_array(columns['lowers']) if 'lowers' in columns else None
+    network = ResidualNetwork(columns['names'].tolist(), column_array(columns['supplies']), column_array(columns['tails']),
+                              column_array(columns['heads']), column_array(columns['costs']), capacities, lowers)
+    size = BINARY_HEADER.size + sum(column.nbytes for column in columns.values())
+    stats = {'lines':0, 'nodes':n, 'arcs':m, 'bytes':size, 'seconds':time.time() - start,
+             'transportation':network.is_transportation()}
+    return network, stats
+
+def main():
+    """
+    Convert input files to the binary network format: python network_io.py INPUT_FILE [BINARY_FILE]
+    """
+    if len(sys.argv) < 2:
+        print 'Usage: %s INPUT_FILE [BINARY_FILE]' % sys.argv[0]
+        return
+    input_filename = sys.argv[1]
+    output_filename = sys.argv[2] if len(sys.argv) > 2 else input_filename.rsplit('.', 1)[0] + '.mcfb'
+    try:
+        network, stats = read_network(input_filename)
+        display_load_info(stats)
+        write_binary_network(network, output_filename)
+        print 'INFO: Written %s' % output_filename
+    except IOError:
+        print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Primal network simplex on the array-backed residual network
+
+The basis is a strongly feasible spanning tree rooted at an artificial node (index n), joined to every
+node by an artificial arc (index m+v, big-M cost). The tree is stored in node vectors: parent, pred
+(tree arc to the parent), pred_dir (UP if pred goes from the node to its parent, DOWN otherwise),
+depth and thread (preorder successor, rev_thread the predecessor). Entering arcs are chosen by block
+search pricing, leaving arcs by the strongly feasible rule (last blocking arc from the apex).
+
+The optimal basis is kept on the network (network.basis), so that a re-solve after arc cost changes
+starts from it (warm_start) instead of from the artificial tree.
+"""
+import logging
+from array import array
+from residual import InfeasibleError, UnboundedError, MAX_INT, log, log_enabled
+from network_io import read_network, display_load_info
+
+STATE_UPPER = -1
+STATE_TREE = 0
+STATE_LOWER = 1
+DIR_UP = 1
+DIR_DOWN = -1
+
+class SpanningTreeBasis(object):
+    """
+    Spanning tree basis of a network simplex solve: tree vectors of the n+1 nodes, and the flow
+    and state (STATE_LOWER, STATE_TREE or STATE_UPPER) of the m input arcs and n artificial arcs
+    """
+
+    def __init__(self, supplies, flow, state, parent, pred, pred_dir, depth, thread, rev_thread):
+        self.supplies = supplies #Node imbalances the tree flow was computed for
+        self.flow = flow
+        self.state = state
+        self.parent = parent
+        self.pred = pred
+        self.pred_dir = pred_dir
+        self.depth = depth
+        self.thread = thread
+        self.rev_thread = rev_thread
+
+    def copy(self):
+        return SpanningTreeBasis(*[list(vector) for vector in (self.supplies, self.flow, self.state, self.parent, self.pred,
+                                                                self.pred_dir, self.depth, self.thread, self.rev_thread)])
+
+def artificial_basis(supplies, m):
+    """
+    Initial basis: every node hangs from the root by its artificial arc, with the node supply as flow
+    (toward the root for supply nodes, so that the zero flow arcs point up)
+    @param m - Number of input arcs, the artificial arcs are numbered after them
+    """
+    n = len(supplies)
+    root = n
+    parent = [root]*n + [-1]
+    pred = range(m, m+n) + [-1]
+    pred_dir = [DIR_UP if b >= 0 else DIR_DOWN for b in supplies] + [0]
+    depth = [1]*n + [0]
+    thread = range(1, n) + [root, 0] if n > 0 else [root]
+    rev_thread = [root] + range(0, n-1) + [n-1] if n > 0 else [root]
+    flow = [0]*m + [abs(b) for b in supplies]
+    state = [STATE_LOWER]*m + [STATE_TREE]*n
+    return SpanningTreeBasis(supplies, flow, state, parent, pred, pred_dir, depth, thread, rev_thread)
+
+def network_simplex_array(network, log_level=None, warm_start=False):
+    """
+    Network simplex algorithm on the array-backed residual network
+    @param log_level - Lowest level of the messages to log (pivots are logged at DEBUG), None for no logging
+    @param warm_start - Start from network.basis if it was computed for the same node supplies (only arc costs
+                        changed), from the artificial basis otherwise
+    @return Run statistics: number of pivots and degenerate pivots
+    """
+    basis = network.basis
+    network.reset()
+    log_pivots = log_enabled(log_level, logging.DEBUG)
+    n, m = network.n, network.m
+    root = n
+    supplies = network.excess.tolist() #Supplies shifted by the lower bounds
+    stats = {'pivots':0, 'degenerate_pivots':0}
+
+    #Input arcs 0..m-1 and artificial arcs m..m+n-1 (artificial arc m+v joins node v and the root)
+    source = network.tail[0::2].tolist() + [v if supplies[v] >= 0 else root for v in xrange(n)]
+    target = network.head[0::2].tolist() + [root if supplies[v] >= 0 else v for v in xrange(n)]
+    cost = network.cost[0::2].tolist()
+    max_cost = max([0] + [abs(c) for c in cost])
+    cost += [(max_cost + 1)*(n + 1)]*n
+    cap = [MAX_INT if c == MAX_INT else c - l for c, l in zip(network.capacity, network.lower)] + [MAX_INT]*n
+
+    #The tree flow of a basis only depends on the supplies (and the artificial arc directions on their signs)
+    if warm_start and basis is not None and basis.supplies == supplies and len(basis.flow) == m + n:
+        basis = basis.copy()
+    else:
+        basis = artificial_basis(supplies, m)
+    flow, state = basis.flow, basis.state
+    parent, pred, pred_dir, depth, thread, rev_thread = basis.parent, basis.pred, basis.pred_dir, basis.depth, \
+                                                        basis.thread, basis.rev_thread
+
+    #Potentials of the tree (zero reduced cost on every tree arc), in preorder from the root
+    potential = [0]*(n+1)
+    node = thread[root]
+    while node != root:
+        e = pred[node]
+        if pred_dir[node] == DIR_UP:
+            potential[node] = cost[e] + potential[parent[node]]
+        else:
+            potential[node] = potential[parent[node]] - cost[e]
+        node = thread[node]
+
+    block_size = max(10, int((m ** 0.5)))
+    next_arc = 0
+    while True:
+        #Block search pricing: the most violating input arc of the first block with a violating arc
+        in_arc = -1
+        best = 0
+        count = 0
+        for step in xrange(m):
+            e = next_arc
+            next_arc += 1
+            if next_arc == m:
+                next_arc = 0
+            violation = state[e]*(cost[e] - potential[source[e]] + potential[target[e]])
+            if violation < best:
+                best = violation
+                in_arc = e
+            count += 1
+            if count == block_size:
+                if in_arc >= 0:
+                    break
+                count = 0
+        if in_arc < 0:
+            break
+
+        #Apex of the cycle closed by the entering arc
+        u, v = source[in_arc], target[in_arc]
+        while u != v:
+            if depth[u] > depth[v]:
+                u = parent[u]
+            elif depth[v] > depth[u]:
+                v = parent[v]
+            else:
+                u, v = parent[u], parent[v]
+        join = u
+
+        #Leaving arc: last blocking arc of the cycle (in the direction of the flow change) from the apex
+        if state[in_arc] == STATE_LOWER:
+            first, second = source[in_arc], target[in_arc]
+        else:
+            first, second = target[in_arc], source[in_arc]
+        delta = cap[in_arc]
+        result = 0
+        u_out = -1
+        node = first
+        while node != join:
+            e = pred[node]
+            d = flow[e] if pred_dir[node] == DIR_UP else cap[e] - flow[e] if cap[e] != MAX_INT else MAX_INT
+            if d < delta:
+                delta, u_out, result = d, node, 1
+            node = parent[node]
+        node = second
+        while node != join:
+            e = pred[node]
+            d = flow[e] if pred_dir[node] == DIR_DOWN else cap[e] - flow[e] if cap[e] != MAX_INT else MAX_INT
+            if d <= delta:
+                delta, u_out, result = d, node, 2
+            node = parent[node]
+        if delta == MAX_INT:
+            raise UnboundedError('Negative cost cycle detected')
+
+        #Flow change along the cycle
+        stats['pivots'] += 1
+        if delta > 0:
+            value = state[in_arc]*delta
+            flow[in_arc] += value
+            node = source[in_arc]
+            while node != join:
+                flow[pred[node]] -= pred_dir[node]*value
+                node = parent[node]
+            node = target[in_arc]
+            while node != join:
+                flow[pred[node]] += pred_dir[node]*value
+                node = parent[node]
+        else:
+            stats['degenerate_pivots'] += 1
+        if log_pivots and in_arc < m:
+            log.debug('Arc %s to %s enters the basis, %s unit(s)', network.names[source[in_arc]], network.names[target[in_arc]], delta)
+
+        if result == 0:
+            #The entering arc is its own blocking arc, it moves to its other bound
+            state[in_arc] = -state[in_arc]
+            continue
+
+        u_in, v_in = (first, second) if result == 1 else (second, first)
+        out_arc = pred[u_out]
+        state[in_arc] = STATE_TREE
+        state[out_arc] = STATE_LOWER if flow[out_arc] == 0 else STATE_UPPER
+
+        #Potential change of the subtree moving with u_in, so that the entering arc gets a zero reduced cost
+        rc = cost[in_arc] - potential[source[in_arc]] + potential[target[in_arc]]
+        sigma = rc if u_in == source[in_arc] else -rc
+
+        #Take the subtree of u_out out of the thread (it is a contiguous block in preorder)
+        last = u_out
+        while depth[thread[last]] > depth[u_out]:
+            last = thread[last]
+        before, after = rev_thread[u_out], thread[last]
+        thread[before] = after
+        rev_thread[after] = before
+
+        #Reverse the tree path from u_in up to u_out, u_in hangs from v_in by the entering arc
+        node, new_parent, new_pred = u_in, v_in, in_arc
+        new_dir = DIR_UP if source[in_arc] == u_in else DIR_DOWN
+        while True:
+            old_parent, old_pred, old_dir = parent[node], pred[node], pred_dir[node]
+            parent[node], pred[node], pred_dir[node] = new_parent, new_pred, new_dir
+            if node == u_out:
+                break
+            node, new_parent, new_pred, new_dir = old_parent, node, old_pred, -old_dir
+
+        #Preorder and depths of the moved subtree, inserted in the thread right after v_in
+        children = {}
+        node = u_out
+        while True:
+            if node != u_in:
+                children.setdefault(parent[node], []).append(node)
+            if node == last:
+                break
+            node = thread[node]
+        order = []
+        stack = [u_in]
+        base = depth[v_in] + 1
+        depth[u_in] = base
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            potential[node] += sigma
+            for child in children.get(node, ()):
+                depth[child] = depth[node] + 1
+                stack.append(child)
+        after = thread[v_in]
+        previous = v_in
+        for node in order:
+            thread[previous] = node
+            rev_thread[node] = previous
+            previous = node
+        thread[previous] = after
+        rev_thread[after] = previous
+
+    if any(flow[m+v] for v in xrange(n)):
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+
+    #Back to the network: flows above the lower bounds, potentials and the optimal basis
+    for i in xrange(m):
+        network.residual[2*i+1] = flow[i]
+        if cap[i] != MAX_INT:
+            network.residual[2*i] = cap[i] - flow[i]
+        else:
+            network.residual[2*i] -= flow[i]
+        network.move_excess(source[i], target[i], flow[i])
+    network.potential[:] = array('l', potential[:n])
+    network.basis = basis
+    return stats
+
+def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
+    fn = raw_input('Input filename:')
+    try:
+        network, stats = read_network(fn)
+        display_load_info(stats)
+        stats = network_simplex_array(network, logging.DEBUG)
+        print 'Total cost: %s (%d pivots)' % (network.total_cost(), stats['pivots'])
+    except IOError:
+        print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
-import networkx as nx
-from numpy import log2
+import numpy
+import logging
 import random
 import sys
+import time
+from residual import ResidualNetwork, ExcessBuckets, InfeasibleError, log, log_enabled, numpy_view, \
+                     augment_shortest_path_forest, round_to_feasible
+from network_io import read_network, display_load_info, graph_from_network
 
 MAX_INT = sys.maxint
 
@@ -11,6 +15,11 @@ EXCESS = 'excess'
 POTENTIAL = 'node_potential'
 FLOW = 'pseudoflow'
 CAPACITY = 'capacity'
+LOWER = 'lower_bound'
+
+ENGINE_ARRAY = 'array'
+ENGINE_NETWORKX = 'networkx'
+ENGINES = (ENGINE_ARRAY, ENGINE_NETWORKX)
 
 _cost = 0
 
@@ -18,34 +27,9 @@ def get_graph_from_input(input_filename):
     """
     Get the graph data from input file
     """
-    f = open(input_filename, 'r')
-    lines  = f.readlines()
-    f.close()
-    node_remember = set()
-    nodes = []
-    edges = []
-    for line in lines:
-        if line.startswith('##') or not line.strip():
-            continue
-        parts = line.split(',')
-        source_info = parts[0].split('|')
-        dest_info = parts[1].split('|')
-        source_node = int(source_info[0])
-        source_amount = int(source_info[1])
-        dest_node = int(dest_info[0])
-        dest_amount = int(dest_info[1])
-        cost = int(parts[2])
-        if source_node not in node_remember:
-            nodes.append((source_node, {UNITS:source_amount}))
-            node_remember.add(source_node)
-        if dest_node not in node_remember:
-            nodes.append((dest_node, {UNITS:dest_amount}))
-            node_remember.add(dest_node)        
-        edges.append((source_node, dest_node, {COST:cost}))
-    dgraph = nx.DiGraph()
-    dgraph.add_nodes_from(nodes)
-    dgraph.add_edges_from(edges)
-    return dgraph
+    network, stats = read_network(input_filename)
+    display_load_info(stats)
+    return graph_from_network(network)
 
 def all_balanced(graph):
     """
@@ -252,11 +236,26 @@ def arcs_expansion_and_cost_cal(contraction_info, ocost):
         
         i += 1
 
-def orlin_scaling(graph):
+def orlin_scaling(graph, engine=ENGINE_ARRAY):
     """
     Edmond-Karp scaling algorithm implementation
+    @return Total cost of the flow
+    @param graph - Input graph (or a ResidualNetwork, see read_network, for ENGINE_ARRAY)
+    @param engine - ENGINE_ARRAY (array-backed residual network) or ENGINE_NETWORKX (attributes of the DiGraph)
     """
     global _cost
+    if engine == ENGINE_ARRAY:
+        network = graph if isinstance(graph, ResidualNetwork) else ResidualNetwork.from_graph(graph)
+        orlin_scaling_array(network, logging.DEBUG)
+        print ''
+        print 'Displaying the resulting graph after flows.'
+        display_graph_info(network.to_graph(),EXCESS,FLOW) #Display for debug
+        return network.total_cost()
+    if engine != ENGINE_NETWORKX:
+        raise ValueError('Unknown engine: %s' % engine)
+    import networkx as nx #Only the NetworkX engine needs it, not imported for the array engine
+    if any(CAPACITY in data or LOWER in data for source,sink,data in graph.edges_iter(data=True)):
+        raise ValueError('The %s engine only solves uncapacitated networks' % ENGINE_NETWORKX)
     mem_n = {}
     mem_e = {}
     #Initialization of x, PI, e, U and delta
@@ -379,15 +378,205 @@ def orlin_scaling(graph):
     #print ocost
     #print contraction_info
     arcs_expansion_and_cost_cal(contraction_info, ocost) #Cost calculation and expansion of contracted nodes
+    return _cost
+
+def expand_contractions(network, tree):
+    """
+    Send the node imbalances left inside every contracted node along its contracted arcs, so that every
+    input arc carries its optimal flow. The contracted arcs of a contracted node form a spanning tree of
+    it, so the flow of a contracted arc is fixed by the imbalances of the nodes on one side of it.
+    @param tree - Contracted input arcs incident to every node
+    """
+    flows = numpy_view(network.lower) + numpy_view(network.residual)[1::2]
+    imbalance = numpy.array(numpy_view(network.supply))
+    numpy.subtract.at(imbalance, numpy_view(network.tail)[0::2], flows)
+    numpy.add.at(imbalance, numpy_view(network.head)[0::2], flows)
+    imbalance = imbalance.tolist()
+    components = network.components
+    for root in xrange(network.n):
+        if components.parent[root] != root or components.size[root] == 1:
+            continue
+        #Contracted nodes in breadth first order from the representative, with the contracted arc to their parent
+        parent_arc = {root:None}
+        order = [root]
+        for node in order:
+            for i in tree[node]:
+                other = network.head[2*i] if network.tail[2*i] == node else network.tail[2*i]
+                if other not in parent_arc:
+                    parent_arc[other] = i
+                    order.append(other)
+        #Leaves first, every node passes its imbalance on to its parent
+        for node in reversed(order[1:]):
+            i = parent_arc[node]
+            amount = imbalance[node]
+            if amount == 0:
+                continue
+            if network.tail[2*i] == node:
+                network.push(2*i, amount)
+                imbalance[network.head[2*i]] += amount
+            else:
+                network.push(2*i+1, amount)
+                imbalance[network.tail[2*i]] += amount
+            imbalance[node] = 0
+
+def contract_arcs_if_exist(network, n, delta, tree, buckets, log_contractions=False):
+    """
+    Contract the endpoints of every arc with pseudoflow at least 4*n*delta
+    (and residual capacity at least 4*n*delta, the optimal flow of the arc is then strictly between its bounds)
+    @param buckets - ExcessBuckets of the nodes, updated when the excess of a node moves to its representative
+    @return Number of contractions
+    """
+    threshold = 4*n*delta #Threshold for pseudoflow check
+    contracted = 0
+    for i in xrange(network.m):
+        if network.residual[2*i+1] < threshold or network.residual[2*i] < threshold:
+            continue
+        source, sink = network.tail[2*i], network.head[2*i]
+        merged = network.components.union(source, sink)
+        if merged is None:
+            continue
+        keep, gone = merged
+        if log_contractions:
+            log.info('--Contraction occurred between %s and %s nodes--%s', network.names[source], network.names[sink], delta)
+        tree[source].append(i)
+        tree[sink].append(i)
+        #The contracted node keeps all its excess at its representative (see expand_contractions)
+        excess = network.excess[gone]
+        network.excess[keep] += excess
+        network.excess[gone] = 0
+        buckets.update(keep)
+        buckets.update(gone)
+        contracted += 1
+    return contracted
+
+def orlin_scaling_array(network, log_level=None, warm_start=False, profiler=None, budget=None):
+    """
+    Orlin's scaling algorithm on the array-backed residual network
+    @param log_level - Lowest level of the messages to log (phases are logged at INFO, flows at DEBUG), None for no logging
+    @param warm_start - Continue from the current flow and potentials of the network (see ResidualNetwork.repair_potentials)
+                        instead of zero flow, delta then starts from the largest node imbalance
+    @param profiler - profiling.PhaseProfiler given a record of every delta phase, None for no profiling
+    @param budget - residual.Budget checked after every delta phase, None to run until the flow is optimal
+    @return Run statistics: number of delta phases, augmentations, shortest path computations and contractions.
+            With a budget, whether it stopped the scaling early, and then the dual bound of the potentials
+            at the stop and the augmentations of the rounding to a feasible flow
+    """
+
+    if budget is not None:
+        budget.start()
+
+    #Initialization of x, PI, e, U and delta
+    if warm_start:
+        network.expand()
+    else:
+        network.reset()
+    log_phases = log_enabled(log_level, logging.INFO)
+    log_flows = log_enabled(log_level, logging.DEBUG)
+    if not warm_start:
+        network.initialize_potentials() #Only needed with negative arc costs
+    n = network.n
+    tree = [[] for v in xrange(n)] #Contracted arcs incident to every node
+    buckets = ExcessBuckets(network, 1) #Source and sink nodes, kept up to date for the whole run
+    delta = buckets.largest() #maximum node imbalance, rounded down to a power of two
+
+    #Warm started flows and arc capacities are not multiples of delta: their paths may use any arc with
+    #residual capacity, so that no arc below delta is left with a negative reduced cost
+    path_delta = 1 if warm_start or network.capacitated() else None
+
+    stats = {'phases':0, 'augmentations':0, 'shortest_paths':0, 'contractions':0}
+    stopped = False
+
+    #Delta scaling phase begins
+    while delta > 0 and not buckets.balanced():
+        if profiler is not None:
+            profile = profiler.start_phase('orlin', delta)
+            start = time.time()
+
+        #delta value verification: a phase sends flow only from a delta-source to a delta/2-sink or from a
+        #delta/2-source to a delta-sink, skip to the next phase with such a pair. This also covers the reset
+        #of delta to the largest imbalance when every imbalance is below delta (whatever the arc flows are),
+        #and skipping phases does not delay contractions, as their threshold only goes down with delta.
+        largest_excess, largest_deficit = buckets.largest(1), buckets.largest(-1)
+        delta = min(delta, max(min(largest_excess, 2*largest_deficit), min(2*largest_excess, largest_deficit)))
+        if delta == 0:
+            break
+        if profiler is not None:
+            now = time.time()
+            profile['delta'] = delta
+            profile['delta_check_seconds'] = now - start
+            start = now
+
+        #Check if contraction requires or not, and do the contraction if appropriate
+        contractions = contract_arcs_if_exist(network, n, delta, tree, buckets, log_phases)
+        stats['contractions'] += contractions
+        if log_phases:
+            log.info('--delta scaling phase with delta value = %s--', delta)
+        stats['phases'] += 1
+        buckets.set_delta(delta, (delta+1)/2)
+        if profiler is not None:
+            profile['contractions'] = contractions
+            profile['contraction_seconds'] = time.time() - start
+        else:
+            profile = None
+        first = True
+        while True:
+            #Either the source or the sink has to be a full delta node
+            S, T = buckets.sources, buckets.sinks
+            if len(S) == 0 and len(T) > 0:
+                S = buckets.half_sources
+            elif len(T) == 0 and len(S) > 0:
+                T = buckets.half_sinks
+            if first and profile is not None:
+                profile['sources'], profile['sinks'] = len(S), len(T)
+            first = False
+            if len(S) == 0 or len(T) == 0:
+                break
+
+            #Shortest paths from all the sources at once, then delta units to every reachable sink
+            augmentations = augment_shortest_path_forest(network, buckets, S, T, delta, path_delta, log_flows, profile)
+            if augmentations == 0:
+                break
+            stats['augmentations'] += augmentations
+            stats['shortest_paths'] += 1
+        if profiler is not None:
+            profiler.end_phase(profile)
+
+        #Update delta
+        delta /= 2
+        if budget is not None and delta > 0 and not buckets.balanced() and budget.exhausted(stats['phases']):
+            stopped = True
+            break
+
+    if budget is not None:
+        stats['stopped'] = stopped
+    if stopped:
+        #Anytime solve: the potentials bound the optimal cost, the remaining excess goes to the deficits unscaled
+        stats['dual_bound'] = network.dual_bound()
+        stats['rounding_augmentations'] = round_to_feasible(network, buckets, log_flows)
+    if not buckets.balanced():
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+    expand_contractions(network, tree)
+    return stats
 
 def main():
+    engine = sys.argv[1] if len(sys.argv) > 1 else ENGINE_ARRAY
+    if engine not in ENGINES:
+        print 'Usage: %s [%s]' % (sys.argv[0], '|'.join(ENGINES))
+        return
+    logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
     fn = raw_input('Input filename:')
     try:
-        dgraph = get_graph_from_input(fn)
-        orlin_scaling(dgraph)
-        print 'Total cost: %s' % _cost
+        if engine == ENGINE_ARRAY:
+            network, stats = read_network(fn)
+            display_load_info(stats)
+            cost = orlin_scaling(network, engine)
+        else:
+            cost = orlin_scaling(get_graph_from_input(fn), engine)
+        print 'Total cost: %s' % cost
     except IOError:
         print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,128 @@
+"""
+Per-phase instrumentation of the delta scaling solvers (rhs and orlin)
+
+    profiler = PhaseProfiler([print_record])
+    result = solve(network, 'orlin', profiler=profiler)
+    profiler.write_csv('phases.csv')
+
+Every delta phase gives one record (dict) with the FIELDS below. The observers are called with
+the record at the end of every phase. The solvers skip all the measuring when no profiler is given.
+From the command line, "python profiling.py INPUT_FILE [--algorithm orlin] [--csv FILE] [--json FILE]"
+solves one instance and prints the time spent in every part of every phase.
+"""
+import argparse
+import csv
+import json
+import time
+from network_io import read_network
+from solver import solve
+
+FIELDS = (
+    'algorithm',
+    'phase',
+    'delta',
+    'sources',                #Source nodes of the first shortest paths of the phase (delta/2-sources when orlin has no delta-source)
+    'sinks',                  #Sink nodes of the first shortest paths of the phase (likewise)
+    'augmentations',
+    'shortest_paths',         #Shortest path forest computations
+    'scanned_nodes',          #Nodes labeled by the shortest path computations
+    'path_arcs',              #Arcs of all the augmenting paths
+    'contractions',
+    'delta_check_seconds',    #Delta reset detection (orlin)
+    'contraction_seconds',
+    'shortest_path_seconds',
+    'augmentation_seconds',
+    'seconds',                #Whole phase
+)
+
+TIMERS = [field for field in FIELDS if field.endswith('seconds')]
+
+class PhaseProfiler(object):
+    """
+    Collects one record per delta phase and passes it to the observers
+    """
+
+    def __init__(self, observers=()):
+        """
+        @param observers - Callables called with the record of every phase when the phase is over
+        """
+        self.observers = list(observers)
+        self.records = []
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def start_phase(self, algorithm, delta):
+        """
+        New record of a phase, with every counter and timer at 0 (the solver fills it in)
+        """
+        record = dict.fromkeys(FIELDS, 0)
+        record.update({'algorithm':algorithm, 'phase':len(self.records) + 1, 'delta':delta, '_start':time.time()})
+        return record
+
+    def end_phase(self, record):
+        record['seconds'] = time.time() - record.pop('_start')
+        self.records.append(record)
+        for observer in self.observers:
+            observer(record)
+
+    def totals(self):
+        """
+        Sum of every counter and timer over all the phases
+        """
+        totals = {}
+        for field in FIELDS[3:]:
+            totals[field] = sum(record[field] for record in self.records)
+        totals['phases'] = len(self.records)
+        return totals
+
+    def write_json(self, filename):
+        """
+        Write the phase records as JSON lines
+        """
+        f = open(filename, 'w')
+        try:
+            for record in self.records:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+        finally:
+            f.close()
+
+    def write_csv(self, filename):
+        """
+        Write the phase records as a CSV table, one column per field
+        """
+        f = open(filename, 'wb')
+        try:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+        finally:
+            f.close()
+
+def print_record(record):
+    print 'phase %(phase)d delta %(delta)d: %(sources)d sources, %(sinks)d sinks, %(augmentations)d augmentations ' \
+          '(%(path_arcs)d arcs), %(shortest_paths)d shortest paths (%(scanned_nodes)d nodes), ' \
+          '%(contractions)d contractions, %(seconds).4f s' % record
+    print '    ' + ', '.join('%s %.4f' % (timer[:-len('_seconds')], record[timer]) for timer in TIMERS[:-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every delta phase of a scaling solver')
+    parser.add_argument('input', help='Network file')
+    parser.add_argument('--algorithm', default='orlin', choices=['orlin', 'rhs'])
+    parser.add_argument('--csv', help='CSV file the phase records are written to')
+    parser.add_argument('--json', help='JSON lines file the phase records are written to')
+    args = parser.parse_args()
+
+    network, stats = read_network(args.input)
+    profiler = PhaseProfiler([print_record])
+    result = solve(network, args.algorithm, profiler=profiler)
+    totals = profiler.totals()
+    print 'Total cost: %s, %.4f s (%d phases: %s)' % (result.cost, result.stats['seconds'], totals['phases'],
+                                                     ', '.join('%s %.4f' % (timer[:-len('_seconds')], totals[timer]) for timer in TIMERS[:-1]))
+    if args.csv:
+        profiler.write_csv(args.csv)
+    if args.json:
+        profiler.write_json(args.json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,884 @@
+"""
+Array-backed residual network shared by the scaling algorithms
+
+Nodes are renumbered 0..n-1 and every input arc i is stored as the pair of
+residual arcs 2*i (forward) and 2*i+1 (reverse), so the partner of residual arc
+a is always a^1. Residual arcs are grouped by their tail in CSR order
+(first_arc/adjacent_arcs). NetworkX is only used at the input and output
+boundary (from_graph/to_graph), and only imported there.
+"""
+import numpy
+from array import array
+from collections import deque
+import heapq
+import logging
+import sys
+import time
+
+MAX_INT = sys.maxint
+LEVELS = MAX_INT.bit_length() + 1 #Bit lengths of the node excesses (see ExcessBuckets)
+
+UNITS = 'units_available'
+COST = 'cost_of_flow'
+EXCESS = 'excess'
+POTENTIAL = 'node_potential'
+FLOW = 'pseudoflow'
+CAPACITY = 'capacity'
+LOWER = 'lower_bound'
+
+log = logging.getLogger('mincostflow')
+log.addHandler(logging.NullHandler())
+
+def log_enabled(log_level, level):
+    """
+    Check (once, outside of the hot loops) if messages of level are wanted
+    @param log_level - Lowest level logged by the caller, None for no logging at all
+    """
+    return log_level is not None and level >= log_level and log.isEnabledFor(level)
+
+def numpy_view(values):
+    """
+    numpy view (no copy) of an array('l')
+    """
+    if len(values) == 0:
+        return numpy.zeros(0, dtype=numpy.int_)
+    return numpy.frombuffer(values, dtype=numpy.int_)
+
+def from_numpy(values):
+    """
+    array('l') copy of a numpy vector
+    """
+    return array('l', numpy.asarray(values, dtype=numpy.int_).tostring())
+
+class InfeasibleError(Exception):
+    """
+    Raised when the node supplies cannot be routed to the node demands
+    """
+
+class UnboundedError(Exception):
+    """
+    Raised when the residual network contains a negative cost cycle
+    """
+
+class Budget(object):
+    """
+    Wall clock and/or phase limit of an anytime solve. The scaling solvers check it at the end of every
+    delta phase; once it is exhausted they stop scaling and round the pseudoflow to a feasible flow
+    (see round_to_feasible).
+    """
+
+    def __init__(self, seconds=None, phases=None):
+        """
+        @param seconds - Wall clock time from start(), None for no time limit
+        @param phases - Number of delta phases, None for no phase limit
+        """
+        self.seconds = seconds
+        self.phases = phases
+        self.deadline = None
+
+    def start(self):
+        if self.seconds is not None:
+            self.deadline = time.time() + self.seconds
+
+    def exhausted(self, phases):
+        """
+        Check if the budget is used up after the given number of phases
+        """
+        if self.phases is not None and phases >= self.phases:
+            return True
+        return self.deadline is not None and time.time() >= self.deadline
+
+class NodeBucket(object):
+    """
+    Set of nodes with constant time insertion, removal and membership test
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.position = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.position
+
+    def add(self, node):
+        if node not in self.position:
+            self.position[node] = len(self.nodes)
+            self.nodes.append(node)
+
+    def discard(self, node):
+        i = self.position.pop(node, None)
+        if i is None:
+            return
+        last = self.nodes.pop()
+        if last != node:
+            self.nodes[i] = last
+            self.position[last] = i
+
+class ExcessLevels(object):
+    """
+    Nodes of one excess sign from a level up, as a read-only bucket (length, membership and iteration)
+    """
+
+    def __init__(self, buckets, level, low, sign):
+        self.buckets = buckets
+        self.level = level
+        self.low = low
+        self.sign = sign
+
+    def __len__(self):
+        return sum(len(self.buckets[i]) for i in xrange(self.low, LEVELS))
+
+    def __contains__(self, node):
+        return self.sign*self.level[node] >= self.low
+
+    def __iter__(self):
+        for i in xrange(LEVELS-1, self.low-1, -1):
+            for node in self.buckets[i]:
+                yield node
+
+class ExcessBuckets(object):
+    """
+    Nodes grouped by the sign and the bit length (level) of their excess, updated one node at a time
+    when the node excess changes instead of rescanning all the nodes. With delta a power of two, the
+    delta-sources (excess >= delta) are the positive levels from delta.bit_length() up, so moving to
+    another delta and finding the largest imbalance only take one step per level.
+    Only representative nodes (see ResidualNetwork.components) are kept.
+    """
+
+    def __init__(self, network, delta, half_delta=None):
+        """
+        @param delta, half_delta - See set_delta
+        """
+        self.network = network
+        self.level = array('l', [0]) * network.n #Bit length of the excess of every node, negative for a deficit
+        self.positive = [NodeBucket() for i in xrange(LEVELS)]
+        self.negative = [NodeBucket() for i in xrange(LEVELS)]
+        self.unbalanced = 0
+        parent = network.components.parent
+        for v in xrange(network.n):
+            if parent[v] == v:
+                self.update(v)
+        self.set_delta(delta, half_delta)
+
+    def set_delta(self, delta, half_delta=None):
+        """
+        Thresholds of the buckets: sources (excess >= delta), sinks (excess <= -delta), half_sources
+        (excess >= half_delta) and half_sinks (excess <= -half_delta)
+        @param delta, half_delta - Powers of two (half_delta is delta if omitted)
+        """
+        self.delta = delta
+        self.half_delta = delta if half_delta is None else half_delta
+        low, half_low = max(1, delta.bit_length()), max(1, self.half_delta.bit_length())
+        self.sources = ExcessLevels(self.positive, self.level, low, 1)
+        self.sinks = ExcessLevels(self.negative, self.level, low, -1)
+        self.half_sources = ExcessLevels(self.positive, self.level, half_low, 1)
+        self.half_sinks = ExcessLevels(self.negative, self.level, half_low, -1)
+
+    def update(self, node):
+        """
+        Move node to the level matching its current excess
+        """
+        excess = self.network.excess[node]
+        level = excess.bit_length() if excess >= 0 else -(-excess).bit_length()
+        old = self.level[node]
+        if level == old:
+            return
+        if old > 0:
+            self.positive[old].discard(node)
+        elif old < 0:
+            self.negative[-old].discard(node)
+        else:
+            self.unbalanced += 1
+        if level > 0:
+            self.positive[level].add(node)
+        elif level < 0:
+            self.negative[-level].add(node)
+        else:
+            self.unbalanced -= 1
+        self.level[node] = level
+
+    def balanced(self):
+        """
+        Check if all the nodes are balanced
+        """
+        return self.unbalanced == 0
+
+    def largest(self, sign=0):
+        """
+        Largest power of two not above the largest excess (sign 1), deficit (sign -1) or
+        either of them (sign 0) of the nodes, 0 if there is none
+        """
+        for i in xrange(LEVELS-1, 0, -1):
+            if (sign >= 0 and len(self.positive[i]) > 0) or (sign <= 0 and len(self.negative[i]) > 0):
+                return 1 << (i-1)
+        return 0
+
+class DisjointSets(object):
+    """
+    Contracted nodes as disjoint sets of nodes (union-find with path compression and union by size).
+    The members of every set are kept in a linked list, so that two sets are merged in constant time.
+    """
+
+    def __init__(self, n):
+        self.parent = array('l', xrange(n))
+        self.size = array('l', [1]) * n
+        self.next_member = array('l', [-1]) * n #Next node of the same set, -1 after the last one
+        self.last_member = array('l', xrange(n)) #Last node of the set of every representative
+
+    def find(self, v):
+        """
+        Representative of the set containing v
+        """
+        parent = self.parent
+        root = v
+        while parent[root] != root:
+            root = parent[root]
+        while parent[v] != root:
+            parent[v], v = root, parent[v]
+        return root
+
+    def union(self, u, v):
+        """
+        Merge the sets containing u and v
+        @return (root, absorbed) - Representative of the merged set and the former representative
+                                   of the smaller set, None if u and v are in the same set already
+        """
+        u, v = self.find(u), self.find(v)
+        if u == v:
+            return None
+        if self.size[u] < self.size[v]:
+            u, v = v, u
+        self.parent[v] = u
+        self.size[u] += self.size[v]
+        self.next_member[self.last_member[u]] = v
+        self.last_member[u] = self.last_member[v]
+        return u, v
+
+class ResidualNetwork(object):
+    """
+    Residual network with node and arc vectors stored in flat arrays
+
+    Node vectors: supply, excess, potential. Contracted nodes are the sets of
+    components (see DisjointSets), represented by one of their nodes.
+    Residual arc vectors: tail, head, cost, residual.
+    Input arc vectors: capacity, lower (lower bound). The lower bounds are sent when the
+    network is reset, so the residual network only sees the flow above the lower bound.
+    """
+
+    def __init__(self, names, supplies, tails, heads, costs, capacities=None, lowers=None):
+        """
+        @param names - Node names, the position of a name is its node index
+        @param supplies - Supply (positive) or demand (negative) of every node
+        @param tails, heads, costs - Node index of the arc endpoints and the arc costs
+        @param capacities - Arc capacities (uncapacitated arcs if omitted)
+        @param lowers - Arc lower bounds (zero if omitted)
+        """
+        n = len(names)
+        m = len(tails)
+        self.n = n
+        self.m = m
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.supply = array('l', supplies)
+        self.excess = array('l', supplies)
+        self.potential = array('l', [0]) * n
+
+        tails, heads, costs = array('l', tails), array('l', heads), array('l', costs)
+        self.tail = array('l', [0]) * (2*m)
+        self.head = array('l', [0]) * (2*m)
+        self.cost = array('l', [0]) * (2*m)
+        self.residual = array('l', [0]) * (2*m)
+        self.capacity = array('l', [MAX_INT]) * m if capacities is None else array('l', capacities)
+        self.tail[0::2], self.tail[1::2] = tails, heads
+        self.head[0::2], self.head[1::2] = heads, tails
+        self.cost[0::2] = costs
+        self.cost[1::2] = from_numpy(-numpy_view(costs))
+        self.lower = array('l', [0]) * m if lowers is None else array('l', lowers)
+        for i in numpy.flatnonzero(numpy_view(self.lower) > numpy_view(self.capacity)):
+            raise ValueError('Arc %s->%s has lower bound %d above its capacity %d' % (self.names[tails[i]], self.names[heads[i]],
+                                                                                   self.lower[i], self.capacity[i]))
+        self.reset()
+
+        #CSR adjacency: residual arcs leaving node v are adjacent_arcs[first_arc[v]:first_arc[v+1]]
+        tail = numpy_view(self.tail)
+        first_arc = numpy.zeros(n+1, dtype=numpy.int_)
+        numpy.cumsum(numpy.bincount(tail, minlength=n), out=first_arc[1:])
+        self.first_arc = from_numpy(first_arc)
+        self.adjacent_arcs = from_numpy(numpy.argsort(tail, kind='mergesort'))
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Build the residual network from an input graph (see get_graph_from_input)
+        """
+        names = graph.nodes()
+        index = dict((name, i) for i, name in enumerate(names))
+        supplies = [graph.node[name][UNITS] for name in names]
+        tails, heads, costs, capacities, lowers = [], [], [], [], []
+        for source,sink,data in graph.edges_iter(data=True):
+            tails.append(index[source])
+            heads.append(index[sink])
+            costs.append(data[COST])
+            capacities.append(data.get(CAPACITY, MAX_INT))
+            lowers.append(data.get(LOWER, 0))
+        return cls(names, supplies, tails, heads, costs, capacities, lowers)
+
+    def to_graph(self):
+        """
+        Output graph with the flow of every input arc and the final node excesses and potentials
+        """
+        import networkx as nx
+        dgraph = nx.DiGraph()
+        for v in xrange(self.n):
+            dgraph.add_node(self.names[v], {UNITS:self.supply[v], EXCESS:self.excess[v], POTENTIAL:self.potential[v]})
+        for i in xrange(self.m):
+            src, snk = self.names[self.tail[2*i]], self.names[self.head[2*i]]
+            dgraph.add_edge(src, snk, {COST:self.cost[2*i], FLOW:self.flow(i), CAPACITY:self.capacity[i], LOWER:self.lower[i]})
+        return dgraph
+
+    def reset(self):
+        """
+        Zero pseudoflow (above the lower bounds), zero potentials and no contracted nodes
+        """
+        for v in xrange(self.n):
+            self.excess[v] = self.supply[v]
+            self.potential[v] = 0
+        self.expand()
+        lower = numpy_view(self.lower)
+        self.residual[0::2] = from_numpy(numpy_view(self.capacity) - lower)
+        self.residual[1::2] = array('l', [0]) * self.m
+        for i in numpy.flatnonzero(lower):
+            self.excess[self.tail[2*i]] -= self.lower[i]
+            self.excess[self.head[2*i]] += self.lower[i]
+
+    def expand(self):
+        """
+        Undo all the contractions and forget the basis of the last network simplex solve,
+        the flow and the potentials are kept
+        """
+        self.components = DisjointSets(self.n)
+        self.basis = None
+
+    def weak_components(self):
+        """
+        Weakly connected components of the network (arc directions ignored)
+        @return [(nodes, arcs)] - numpy vectors of the node and input arc indices of every component,
+                                  the largest component first
+        """
+        sets = DisjointSets(self.n)
+        tails, heads = self.tail[0::2], self.head[0::2]
+        for i in xrange(self.m):
+            sets.union(tails[i], heads[i])
+        roots, labels = numpy.unique([sets.find(v) for v in xrange(self.n)], return_inverse=True)
+        count = len(roots)
+        node_order = numpy.argsort(labels, kind='mergesort')
+        node_bounds = numpy.r_[0, numpy.cumsum(numpy.bincount(labels, minlength=count))]
+        arc_labels = labels[numpy_view(tails)]
+        arc_order = numpy.argsort(arc_labels, kind='mergesort')
+        arc_bounds = numpy.r_[0, numpy.cumsum(numpy.bincount(arc_labels, minlength=count))]
+        components = [(node_order[node_bounds[c]:node_bounds[c+1]], arc_order[arc_bounds[c]:arc_bounds[c+1]])
+                      for c in xrange(count)]
+        components.sort(key=lambda component: -(len(component[0]) + len(component[1])))
+        return components
+
+    def subnetwork(self, nodes, arcs):
+        """
+        Network of the given nodes and input arcs (the arcs have to join nodes of the list), with the
+        supplies, costs, capacities and lower bounds of this network. The nodes and arcs are renumbered
+        in the order of the lists.
+        """
+        local = numpy.zeros(self.n, dtype=numpy.int_)
+        local[nodes] = numpy.arange(len(nodes))
+        return ResidualNetwork([self.names[v] for v in nodes], numpy_view(self.supply)[nodes],
+                               local[numpy_view(self.tail)[2*arcs]], local[numpy_view(self.head)[2*arcs]],
+                               numpy_view(self.cost)[2*arcs], numpy_view(self.capacity)[arcs], numpy_view(self.lower)[arcs])
+
+    def set_flows(self, nodes, arcs, flows, potentials):
+        """
+        Set the flow of some input arcs and the potentials of some nodes, e.g. from the solution of
+        subnetwork(nodes, arcs). The excesses of the arc endpoints change accordingly.
+        @param flows - Flow of every arc, including its lower bound
+        """
+        residual, excess = numpy_view(self.residual), numpy_view(self.excess)
+        change = numpy.asarray(flows, dtype=numpy.int_) - numpy_view(self.lower)[arcs] - residual[2*arcs+1]
+        residual[2*arcs+1] += change
+        residual[2*arcs] -= change
+        numpy.subtract.at(excess, numpy_view(self.tail)[2*arcs], change)
+        numpy.add.at(excess, numpy_view(self.head)[2*arcs], change)
+        numpy_view(self.potential)[nodes] = potentials
+
+    def set_supply(self, v, supply):
+        """
+        Change the supply of node v, the difference is added to its excess
+        """
+        self.excess[v] += supply - self.supply[v]
+        self.supply[v] = supply
+
+    def set_cost(self, i, cost):
+        """
+        Change the cost of input arc i (see repair_potentials to restore the optimality conditions)
+        """
+        self.cost[2*i] = cost
+        self.cost[2*i+1] = -cost
+
+    def repair_potentials(self, arcs):
+        """
+        Restore non-negative reduced costs on the residual network after the costs of some input arcs changed.
+        A negative uncapacitated arc raises the potential of its head (label correcting from there on),
+        any other negative residual arc is saturated and its residual capacity becomes node excess.
+        @param arcs - Input arcs whose costs changed
+        """
+        n = self.n
+        potential, capacity = self.potential, self.capacity
+        first_arc, adjacent_arcs = self.first_arc, self.adjacent_arcs
+        tail, head, cost, residual = self.tail, self.head, self.cost, self.residual
+        count = [0]*n
+        in_queue = [False]*n
+        queue = deque()
+
+        def repair(a):
+            if residual[a] <= 0:
+                return
+            rc = cost[a] - potential[tail[a]] + potential[head[a]]
+            if rc >= 0:
+                return
+            v = head[a]
+            if a & 1 == 0 and capacity[a >> 1] == MAX_INT:
+                potential[v] -= rc
+                if not in_queue[v]:
+                    count[v] += 1
+                    if count[v] > n:
+                        raise UnboundedError('Negative cost cycle detected')
+                    queue.append(v)
+                    in_queue[v] = True
+            else:
+                self.saturate(a)
+
+        for i in arcs:
+            repair(2*i)
+            repair(2*i+1)
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            for idx in xrange(first_arc[u], first_arc[u+1]):
+                repair(adjacent_arcs[idx])
+
+    def capacitated(self):
+        """
+        Check if some arc has a finite capacity
+        """
+        return any(c != MAX_INT for c in self.capacity)
+
+    def is_transportation(self):
+        """
+        Check if the network is a transportation problem: every arc is uncapacitated, without lower bound
+        and goes straight from a supply node to a demand node (nodes with a zero supply may be on either
+        side, but not on both)
+        """
+        if self.m == 0:
+            return False
+        supply, tails, heads = numpy_view(self.supply), numpy_view(self.tail)[0::2], numpy_view(self.head)[0::2]
+        is_tail, is_head = numpy.zeros(self.n, dtype=bool), numpy.zeros(self.n, dtype=bool)
+        is_tail[tails] = True
+        is_head[heads] = True
+        return bool((supply[tails] >= 0).all() and (supply[heads] <= 0).all() and not (is_tail & is_head).any()
+                    and (numpy_view(self.capacity) == MAX_INT).all() and not numpy_view(self.lower).any())
+
+    def flow(self, i):
+        """
+        Flow on input arc i, including its lower bound
+        """
+        return self.lower[i] + self.residual[2*i+1]
+
+    def reduced_cost(self, a):
+        """
+        Reduced cost of residual arc a with respect to the node potentials
+        """
+        return self.cost[a] - self.potential[self.tail[a]] + self.potential[self.head[a]]
+
+    def push(self, a, delta):
+        """
+        Send delta units along residual arc a (the node excesses are not touched)
+        """
+        self.residual[a] -= delta
+        self.residual[a^1] += delta
+
+    def saturate(self, a):
+        """
+        Send the whole residual capacity of residual arc a, the node excesses of its endpoints are updated
+        """
+        delta = self.residual[a]
+        self.push(a, delta)
+        self.excess[self.tail[a]] -= delta
+        self.excess[self.head[a]] += delta
+
+    def total_cost(self):
+        """
+        Cost of the current pseudoflow with respect to the original arc costs
+        """
+        return sum(self.cost[2*i]*self.flow(i) for i in xrange(self.m))
+
+    def dual_bound(self):
+        """
+        Lower bound on the cost of every feasible flow given by the current potentials (weak duality):
+        the cost of a flow x is sum(potential*supply) plus the sum of the reduced costs times x, and the
+        flow of every arc is at least its lower bound and at most its capacity
+        @return Bound, None if an uncapacitated arc has a negative reduced cost (no finite bound)
+        """
+        tails, heads = numpy_view(self.tail)[0::2], numpy_view(self.head)[0::2]
+        potential, capacity, lower = numpy_view(self.potential), numpy_view(self.capacity), numpy_view(self.lower)
+        reduced = numpy_view(self.cost)[0::2] - potential[tails] + potential[heads]
+        negative = reduced < 0
+        if (capacity[negative] == MAX_INT).any():
+            return None
+        bound = sum(p*b for p, b in zip(self.potential, self.supply))
+        bound += sum(int(reduced[i])*int(capacity[i]) for i in numpy.flatnonzero(negative))
+        bound += sum(int(reduced[i])*int(lower[i]) for i in numpy.flatnonzero(~negative & (lower != 0)))
+        return bound
+
+    def move_excess(self, k, l, delta):
+        """
+        Update the node excesses after delta units are sent along a path from k to l
+        """
+        self.excess[k] -= delta
+        self.excess[l] += delta
+
+    def initialize_potentials(self):
+        """
+        Make every reduced cost of the residual network non-negative, which is needed by dijkstra
+        if some arc costs are negative. The potentials come from the uncapacitated arcs alone (only a
+        negative cycle of those is unbounded, see correct_potentials), then every capacitated arc with a
+        negative reduced cost is saturated, which leaves its reverse arc with a positive one.
+        """
+        uncapacitated = numpy_view(self.capacity) == MAX_INT
+        self.correct_potentials([2*i for i in numpy.flatnonzero(uncapacitated)])
+        for i in numpy.flatnonzero(~uncapacitated):
+            if self.residual[2*i] > 0 and self.reduced_cost(2*i) < 0:
+                self.saturate(2*i)
+
+    def correct_potentials(self, arcs=None):
+        """
+        Bellman-Ford pass from a virtual source joined to every node with zero cost arcs, the flow is
+        not changed. The resulting potentials make the reduced costs of the given arcs non-negative.
+        @param arcs - Residual arcs to consider, every arc with a residual capacity if None
+        """
+        if arcs is None:
+            arcs = [a for a in xrange(2*self.m) if self.residual[a] > 0]
+        if all(self.reduced_cost(a) >= 0 for a in arcs):
+            return
+        usable = [False]*(2*self.m)
+        for a in arcs:
+            usable[a] = True
+        n = self.n
+        potential, first_arc, adjacent_arcs, head = self.potential, self.first_arc, self.adjacent_arcs, self.head
+        dist = [0]*n
+        count = [0]*n
+        in_queue = [True]*n
+        queue = deque(xrange(n))
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            for idx in xrange(first_arc[u], first_arc[u+1]):
+                a = adjacent_arcs[idx]
+                if not usable[a]:
+                    continue
+                v = head[a]
+                nd = dist[u] + self.reduced_cost(a)
+                if nd < dist[v]:
+                    dist[v] = nd
+                    if not in_queue[v]:
+                        count[v] += 1
+                        if count[v] > n:
+                            raise UnboundedError('Negative cost cycle detected')
+                        queue.append(v)
+                        in_queue[v] = True
+        for v in xrange(n):
+            potential[v] -= dist[v]
+
+    def shortest_paths(self, sources, delta, targets=()):
+        """
+        Shortest paths from the nodes of sources (all at distance 0, as from a super source joined to them)
+        in the delta-residual network, using reduced costs and contracted nodes.
+        Dijkstra is used while the reduced costs are non-negative, Bellman-Ford otherwise.
+        @param targets - Stop as soon as the distance of every one of these nodes is known
+        @return (dist, pred, labeled) - Distance (None if unreachable) and predecessor residual arc (-1 at the
+                                        roots of the shortest path forest) of every representative node,
+                                        and the nodes with a distance
+        """
+        result = self.dijkstra(sources, delta, targets)
+        if result is None:
+            result = self.bellman_ford(sources, delta)
+        return result
+
+    def dijkstra(self, sources, delta, targets=()):
+        """
+        Heap based Dijkstra on reduced costs, see shortest_paths.
+        Distances of the nodes not settled before the last target are only upper bounds (at least its distance).
+        @return None if a negative reduced cost is met
+        """
+        n = self.n
+        parent, next_member, find = self.components.parent, self.components.next_member, self.components.find
+        potential = self.potential
+        first_arc, adjacent_arcs = self.first_arc, self.adjacent_arcs
+        head, cost, residual = self.head, self.cost, self.residual
+        dist = [None]*n
+        pred = [-1]*n
+        settled = [False]*n
+        for source in sources:
+            dist[source] = 0
+        labeled = list(sources)
+        heap = [(0, source) for source in sources]
+        heapq.heapify(heap)
+        remaining = len(targets)
+        while heap:
+            du, u = heapq.heappop(heap)
+            if settled[u]:
+                continue
+            settled[u] = True
+            if remaining and u in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            member = u
+            while member >= 0:
+                pm = potential[member]
+                for idx in xrange(first_arc[member], first_arc[member+1]):
+                    a = adjacent_arcs[idx]
+                    if residual[a] < delta:
+                        continue
+                    h = head[a]
+                    v = parent[h]
+                    if parent[v] != v:
+                        v = find(h)
+                    if settled[v]:
+                        continue
+                    rc = cost[a] - pm + potential[h]
+                    if rc < 0:
+                        return None
+                    nd = du + rc
+                    if dist[v] is None or nd < dist[v]:
+                        if dist[v] is None:
+                            labeled.append(v)
+                        dist[v] = nd
+                        pred[v] = a
+                        heapq.heappush(heap, (nd, v))
+                member = next_member[member]
+        return dist, pred, labeled
+
+    def bellman_ford(self, sources, delta):
+        """
+        Bellman-Ford (FIFO label correcting) version of shortest_paths, for negative reduced costs
+        """
+        n = self.n
+        parent, next_member, find = self.components.parent, self.components.next_member, self.components.find
+        potential = self.potential
+        first_arc, adjacent_arcs = self.first_arc, self.adjacent_arcs
+        head, cost, residual = self.head, self.cost, self.residual
+        dist = [None]*n
+        pred = [-1]*n
+        count = [0]*n
+        in_queue = [False]*n
+        for source in sources:
+            dist[source] = 0
+            in_queue[source] = True
+        labeled = list(sources)
+        queue = deque(sources)
+        while queue:
+            u = queue.popleft()
+            in_queue[u] = False
+            du = dist[u]
+            member = u
+            while member >= 0:
+                pm = potential[member]
+                for idx in xrange(first_arc[member], first_arc[member+1]):
+                    a = adjacent_arcs[idx]
+                    if residual[a] < delta:
+                        continue
+                    h = head[a]
+                    v = parent[h]
+                    if parent[v] != v:
+                        v = find(h)
+                    if v == u:
+                        continue
+                    nd = du + cost[a] - pm + potential[h]
+                    if dist[v] is None or nd < dist[v]:
+                        if dist[v] is None:
+                            labeled.append(v)
+                        dist[v] = nd
+                        pred[v] = a
+                        if not in_queue[v]:
+                            count[v] += 1
+                            if count[v] > n:
+                                raise UnboundedError('Negative cost cycle detected')
+                            queue.append(v)
+                            in_queue[v] = True
+                member = next_member[member]
+        return dist, pred, labeled
+
+    def update_potentials(self, dist, limit, labeled):
+        """
+        Subtract the shortest path distances (capped at limit) from the node potentials.
+        Subtracting limit from every potential does not change any reduced cost, so only
+        the labeled nodes closer than limit are touched.
+        """
+        next_member, potential = self.components.next_member, self.potential
+        for u in labeled:
+            d = dist[u]
+            if d < limit:
+                member = u
+                while member >= 0:
+                    potential[member] += limit - d
+                    member = next_member[member]
+
+class AdmissibleSearch(object):
+    """
+    Depth first search for admissible paths: residual arcs with a zero reduced cost and at least threshold
+    residual capacity, between representative nodes. Every node keeps its current arc (scanning goes on from
+    there in the next search) and nodes found without a path to a target are dead for the rest of the
+    search, so that finding many paths in a row scans every arc about once.
+    """
+
+    def __init__(self, network, threshold):
+        self.network = network
+        self.threshold = threshold
+        self.dead = bytearray(network.n)
+        self.on_path = bytearray(network.n)
+        self.member = [None]*network.n #Contracted member whose arcs are scanned, -1 once all are
+        self.position = [0]*network.n #Current arc, index in adjacent_arcs
+
+    def next_arc(self, u):
+        """
+        Next admissible arc out of u (or a member of its contracted node) to a node neither dead nor on the
+        current path, with the node it leads to; None if there is none left
+        """
+        network = self.network
+        first_arc, adjacent_arcs, residual = network.first_arc, network.adjacent_arcs, network.residual
+        head, cost, potential = network.head, network.cost, network.potential
+        find, next_member = network.components.find, network.components.next_member
+        dead, on_path, threshold = self.dead, self.on_path, self.threshold
+        member, idx = self.member[u], self.position[u]
+        if member is None:
+            member, idx = u, first_arc[u]
+        found = None
+        while member >= 0:
+            pm, end = potential[member], first_arc[member+1]
+            while idx < end:
+                a = adjacent_arcs[idx]
+                if residual[a] >= threshold and cost[a] - pm + potential[head[a]] == 0:
+                    v = find(head[a])
+                    if v != u and not dead[v] and not on_path[v]:
+                        found = (a, v)
+                        break
+                idx += 1
+            if found is not None:
+                break
+            member = next_member[member]
+            if member >= 0:
+                idx = first_arc[member]
+        self.member[u], self.position[u] = member, idx
+        return found
+
+    def path(self, k, targets):
+        """
+        Admissible path from node k to a node of targets
+        @return (residual arcs of the path, target node), None if there is none (k is then dead)
+        """
+        nodes, arcs = [k], []
+        self.on_path[k] = True
+        found = None
+        while nodes:
+            u = nodes[-1]
+            step = self.next_arc(u)
+            if step is None:
+                self.dead[u] = True
+                self.on_path[u] = False
+                nodes.pop()
+                if arcs:
+                    arcs.pop()
+                continue
+            a, v = step
+            arcs.append(a)
+            if v in targets:
+                found = (arcs, v)
+                break
+            nodes.append(v)
+            self.on_path[v] = True
+        for u in nodes:
+            self.on_path[u] = False
+        return found
+
+def augment_shortest_path_forest(network, buckets, S, T, delta, path_delta=None, log_flows=False, profile=None):
+    """
+    One round of batched augmentations of a scaling phase. The shortest path forest from all the nodes
+    of S at once is computed and the potentials are updated so that all its arcs get a zero reduced cost.
+    Flow is then sent from every node of S along admissible paths (zero reduced cost, see AdmissibleSearch)
+    to any node of T, as long as there is one: sending flow on zero reduced cost arcs keeps the reduced
+    costs non-negative, so the shortest paths are only recomputed in the next round.
+    @param buckets - ExcessBuckets that S and T belong to, updated after every augmentation
+    @param delta - Flow sent by every augmentation, less along a path with a smaller arc if path_delta is set,
+                   None to send as much as the imbalances of the source and the sink allow (path_delta has to be set)
+    @param path_delta - Smallest residual capacity of the path arcs, delta if None
+    @param profile - Phase record of a profiling.PhaseProfiler the counters and timers are added to, None for no profiling
+    @return Number of augmentations, 0 if no node of T can be reached from S
+    """
+    if profile is not None:
+        start = time.time()
+    dist, pred, labeled = network.shortest_paths(list(S), path_delta or delta, T)
+    reached = sorted((dist[l], l) for l in T if dist[l] is not None)
+    if reached:
+        network.update_potentials(dist, reached[-1][0], labeled)
+    if profile is not None:
+        now = time.time()
+        profile['shortest_paths'] += 1
+        profile['scanned_nodes'] += len(labeled)
+        profile['shortest_path_seconds'] += now - start
+        start = now
+    residual, tail, head, names, excess = network.residual, network.tail, network.head, network.names, network.excess
+    augmentations = 0
+    path_arcs = 0
+    search = AdmissibleSearch(network, path_delta or delta)
+    for k in (list(S) if reached else []):
+        while k in S:
+            path = search.path(k, T)
+            if path is None:
+                break
+            arcs, l = path
+            amount = min([delta or min(excess[k], -excess[l])] + [residual[a] for a in arcs])
+            for a in arcs:
+                network.push(a, amount)
+                if log_flows:
+                    log.debug('Flow from %s to %s %s unit(s)', names[tail[a]], names[head[a]], amount)
+            #Only the excesses of k and l change, the flow inside contracted nodes is set when they are expanded
+            network.move_excess(k, l, amount)
+            buckets.update(k)
+            buckets.update(l)
+            augmentations += 1
+            path_arcs += len(arcs)
+    if profile is not None:
+        profile['augmentations'] += augmentations
+        profile['path_arcs'] += path_arcs
+        profile['augmentation_seconds'] += time.time() - start
+    return augmentations
+
+def round_to_feasible(network, buckets, log_flows=False, profile=None):
+    """
+    Send the remaining node excesses to the remaining deficits along shortest residual paths (any arc with
+    residual capacity), as much as the imbalances allow on every path. This turns the pseudoflow of a
+    scaling solver stopped early (see Budget) into a feasible flow.
+    @param buckets - ExcessBuckets of the nodes, their thresholds are set to 1
+    @return Number of augmentations
+    """
+    buckets.set_delta(1)
+    augmentations = 0
+    while len(buckets.sources) > 0 and len(buckets.sinks) > 0:
+        count = augment_shortest_path_forest(network, buckets, buckets.sources, buckets.sinks, None, 1, log_flows, profile)
+        if count == 0:
+            break
+        augmentations += count
+    return augmentations
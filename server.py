@@ -0,0 +1,235 @@
+"""
+Long-running solver server: JSON-lines solve requests in, one JSON line per result out
+
+    python server.py [--workers 4] [--socket /tmp/mincostflow.sock] [--cache DIRECTORY]
+
+Requests are read from stdin (results written to stdout), or from every connection to the Unix socket
+(results written back to the connection). Every request is one JSON object on one line:
+    {"id": 1, "input": "./input/input_1.txt"}
+    {"id": 2, "nodes": [[1, 4], [2, -4]], "arcs": [[1, 2, 3], [1, 2, 5, 10, 0]], "algorithm": "rhs"}
+with the network either in a file (any format read_network reads) or inline: the supply of the nodes and
+the tail, head, cost and optional capacity and lower bound of the arcs (nodes only named by arcs have
+supply 0). Optional fields: "algorithm" (default auto, see solver.choose_algorithm), "seconds" and
+"phases" (anytime solve within a budget, see residual.Budget), "flows" (default true) and "potentials"
+(default false) to include them.
+Results come back as soon as they are solved, not in request order, and carry the request id:
+    {"id": 1, "cost": 36, "flows": [...], "stats": {...}, "timing": {...}, "worker": PID}
+    {"id": 3, "error": "..."}
+timing gives the seconds spent queued, loading the network, solving it and in total (from the request
+line being read to the result being written). The workers are started once and import the solver modules
+(NumPy and the rest) while the first request is read, so only the first requests pay for the imports.
+With --cache DIRECTORY, exact solves go through a cache.SolutionCache per worker sharing that directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import Queue
+import signal
+import socket
+import SocketServer
+import sys
+import threading
+import time
+
+_cache = None #Solution cache of the worker process, if any
+
+def warm_up(cache_directory):
+    """
+    Worker initializer: import the solver modules once per worker process and open the solution cache
+    """
+    global _cache
+    signal.signal(signal.SIGINT, signal.SIG_IGN) #Ctrl-C stops the server, which then lets the workers finish
+    import solver
+    import network_io
+    if cache_directory is not None:
+        from cache import SolutionCache
+        _cache = SolutionCache(directory=cache_directory)
+
+def network_from_request(request):
+    """
+    ResidualNetwork of the "nodes" and "arcs" fields of a request
+    """
+    from residual import ResidualNetwork, MAX_INT
+    names, supplies, index = [], [], {}
+    for name, supply in request.get('nodes', []):
+        index[name] = len(names)
+        names.append(name)
+        supplies.append(supply)
+    tails, heads, costs, capacities, lowers = [], [], [], [], []
+    for arc in request['arcs']:
+        if not 3 <= len(arc) <= 5:
+            raise ValueError('Arc %s: expected [tail, head, cost(, capacity(, lower bound))]' % json.dumps(arc))
+        for name in arc[:2]:
+            if name not in index:
+                index[name] = len(names)
+                names.append(name)
+                supplies.append(0)
+        tails.append(index[arc[0]])
+        heads.append(index[arc[1]])
+        costs.append(arc[2])
+        capacities.append(arc[3] if len(arc) > 3 and arc[3] is not None else MAX_INT)
+        lowers.append(arc[4] if len(arc) > 4 else 0)
+    return ResidualNetwork(names, supplies, tails, heads, costs, capacities, lowers)
+
+def handle(request, received):
+    """
+    Worker: load and solve the network of one request
+    @param received - Time the request line was read, for the queueing time
+    @return Response object
+    """
+    from network_io import read_network
+    from residual import Budget
+    from solver import solve
+    start = time.time()
+    response = {'id':request.get('id')}
+    try:
+        if 'input' in request:
+            network, stats = read_network(request['input'])
+        else:
+            network = network_from_request(request)
+        loaded = time.time()
+        algorithm = request.get('algorithm', 'auto')
+        if 'seconds' in request or 'phases' in request:
+            result = solve(network, algorithm, budget=Budget(request.get('seconds'), request.get('phases')))
+        elif _cache is not None:
+            result = _cache.solve(network, algorithm)
+        else:
+            result = solve(network, algorithm)
+        solved = time.time()
+        response.update({'algorithm':result.algorithm, 'cost':result.cost, 'stats':result.stats})
+        if request.get('flows', True):
+            response['flows'] = result.flows.tolist()
+        if request.get('potentials', False):
+            response['potentials'] = result.potentials.tolist()
+        response['timing'] = {'queued':start - received, 'load':loaded - start, 'solve':solved - loaded}
+    except Exception as e: #Any bad request only fails its own response, the worker keeps serving
+        response['error'] = '%s: %s' % (e.__class__.__name__, e)
+    response['worker'] = os.getpid()
+    return response
+
+class RequestStream(object):
+    """
+    Requests of one input stream dispatched to the worker pool, with their results written to one output
+    stream in completion order. The results are queued by the pool callback and written by a writer thread
+    of the stream, so that a slow or closed output never holds up the result thread shared by all the
+    streams; once a write fails, the stream is dead and its later results are dropped.
+    """
+
+    def __init__(self, pool, output):
+        self.pool = pool
+        self.output = output
+        self.results = Queue.Queue() #(response, received time), None when the stream is over
+        self.dead = False
+        self.pending = []
+        self.writer = threading.Thread(target=self.write_results)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def write_results(self):
+        """
+        Writer thread: write the queued results until the end of the stream
+        """
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            if self.dead:
+                continue
+            response, received = item
+            if 'timing' in response:
+                response['timing']['total'] = time.time() - received
+            try:
+                line = json.dumps(response, sort_keys=True) + '\n'
+            except (TypeError, ValueError) as e:
+                line = json.dumps({'id':response.get('id'), 'error':'Unserializable result: %s' % e}) + '\n'
+            try:
+                self.output.write(line)
+                self.output.flush()
+            except (IOError, socket.error):
+                self.dead = True #The client went away
+
+    def submit(self, line):
+        received = time.time()
+        line = line.strip()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request is a JSON object')
+        except ValueError as e:
+            self.results.put(({'id':None, 'error':'Invalid request: %s' % e}, received))
+            return
+        self.pending = [pending for pending in self.pending if not pending.ready()]
+        #Runs in the result thread of the pool: only queue the result, no I/O
+        self.pending.append(self.pool.apply_async(handle, (request, received),
+                                                  callback=lambda response: self.results.put((response, received))))
+
+    def serve(self, lines):
+        """
+        Submit every request line, then wait until all the results are written (or dropped)
+        """
+        try:
+            for line in lines:
+                if self.dead:
+                    break
+                self.submit(line)
+        except (IOError, socket.error):
+            self.dead = True
+        for pending in self.pending:
+            pending.wait()
+        self.results.put(None)
+        self.writer.join()
+
+class ConnectionHandler(SocketServer.StreamRequestHandler):
+    """
+    One client connection to the Unix socket, see RequestStream
+    """
+
+    def handle(self):
+        RequestStream(self.server.pool, self.wfile).serve(iter(self.rfile.readline, ''))
+
+    def finish(self):
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except (IOError, socket.error):
+            pass #The client went away, its unwritten results are dropped
+
+class SolverServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, pool):
+        self.pool = pool
+        SocketServer.UnixStreamServer.__init__(self, path, ConnectionHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve JSON-lines min-cost flow requests with a pool of warm workers')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--socket', help='Unix socket to serve instead of stdin/stdout')
+    parser.add_argument('--cache', help='Directory of the solution cache shared by the workers')
+    args = parser.parse_args()
+
+    pool = multiprocessing.Pool(args.workers, initializer=warm_up, initargs=(args.cache,))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) #Stop like Ctrl-C when killed
+    try:
+        if args.socket is None:
+            #readline instead of iterating over stdin, which reads ahead and would hold requests back
+            RequestStream(pool, sys.stdout).serve(iter(sys.stdin.readline, ''))
+        else:
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+            server = SolverServer(args.socket, pool)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+                os.remove(args.socket)
+    finally:
+        pool.close()
+        pool.join()
+
+if __name__ == '__main__':
+    main()
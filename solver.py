@@ -0,0 +1,210 @@
+"""
+Library entry point: solve a min-cost flow network and get the result back as an object
+
+    network, stats = read_network('./input/input_1.txt')
+    result = solve(network) #algorithm='auto': the transportation simplex for transportation instances, orlin otherwise
+    print result.cost, result.flow_dict()
+
+    result = resolve(network, supplies={1:4, 4:-3}) #Warm start from the previous solution
+    result = solve_components(network, workers=4) #Every weakly connected component on its own
+    result = solve(network, budget=residual.Budget(seconds=0.5)) #Anytime: feasible flow, result.stats['gap'] bounds its excess cost
+
+Nothing is printed and no module state is used, so several solves can run in one process.
+Progress messages go to the 'mincostflow' logger when verbose is set (True for the delta
+phases, logging.DEBUG for every flow augmentation as well).
+"""
+import logging
+import multiprocessing
+import time
+from array import array
+from residual import ResidualNetwork, InfeasibleError
+import edmonds_karp
+import orlin
+import cost_scaling
+import network_simplex
+import transportation
+
+ALGORITHMS = {
+    'rhs':edmonds_karp.rhs_scaling_array,
+    'orlin':orlin.orlin_scaling_array,
+    'cost_scaling':cost_scaling.cost_scaling_array,
+    'network_simplex':network_simplex.network_simplex_array,
+    'transportation':transportation.transportation_simplex_array,
+}
+
+PROFILED = ('rhs', 'orlin') #Algorithms taking a profiler (see profiling.PhaseProfiler)
+BUDGETED = ('rhs', 'orlin') #Algorithms taking a budget (see residual.Budget)
+AUTO = 'auto' #Algorithm chosen from the network, see choose_algorithm
+
+class FlowResult(object):
+    """
+    Optimal flow of a network: flow of every input arc (in input order), total cost,
+    node potentials (dual solution) and run statistics of the solver. The network simplex
+    solver also gives its optimal spanning tree basis (see network_simplex.SpanningTreeBasis).
+    """
+
+    def __init__(self, network, algorithm, stats):
+        self.algorithm = algorithm
+        self.names = network.names
+        self.tails = network.tail[0::2]
+        self.heads = network.head[0::2]
+        self.flows = array('l', (network.flow(i) for i in xrange(network.m)))
+        self.cost = network.total_cost()
+        self.potentials = array('l', network.potential)
+        self.stats = stats
+        self.basis = network.basis
+
+    def flow_dict(self):
+        """
+        Flow from every node to every node with an input arc, {(source, sink): flow}
+        """
+        flows = {}
+        for i in xrange(len(self.flows)):
+            key = (self.names[self.tails[i]], self.names[self.heads[i]])
+            flows[key] = flows.get(key, 0) + self.flows[i]
+        return flows
+
+    def potential_dict(self):
+        """
+        Potential of every node, {node: potential}
+        """
+        return dict(zip(self.names, self.potentials))
+
+def choose_algorithm(network, algorithm, warm_start=False, profiler=None, budget=None):
+    """
+    Algorithm to run for AUTO: the transportation simplex for a transportation instance (see
+    ResidualNetwork.is_transportation) solved from scratch, orlin otherwise. Other names are kept.
+    """
+    if algorithm != AUTO:
+        return algorithm
+    if not warm_start and profiler is None and budget is None and network.is_transportation():
+        return 'transportation'
+    return 'orlin'
+
+def solve(network, algorithm=AUTO, verbose=False, warm_start=False, profiler=None, budget=None):
+    """
+    Solve a min-cost flow problem
+    @param network - ResidualNetwork (its flow and potentials are overwritten) or input graph (see get_graph_from_input)
+    @param algorithm - Name of the algorithm, see ALGORITHMS, or AUTO (see choose_algorithm)
+    @param verbose - False for no logging, True for the delta phases, or the lowest logging level to log
+    @param warm_start - Start from the current flow and potentials of the network instead of zero flow
+    @param profiler - profiling.PhaseProfiler recording every delta phase (only for the algorithms of PROFILED)
+    @param budget - residual.Budget of the solve (only for the algorithms of BUDGETED). The scaling stops at the end of
+                    the phase that uses it up and the flow is rounded to a feasible one, which may not be optimal:
+                    stats['dual_bound'] is then a lower bound on the optimal cost, stats['gap'] the most the cost can
+                    be above the optimal cost and stats['relative_gap'] that gap over the cost (None without a bound)
+    """
+    if algorithm not in ALGORITHMS and algorithm != AUTO:
+        raise ValueError('Unknown algorithm: %s' % algorithm)
+    if not isinstance(network, ResidualNetwork):
+        network = ResidualNetwork.from_graph(network)
+    algorithm = choose_algorithm(network, algorithm, warm_start, profiler, budget)
+    if profiler is not None and algorithm not in PROFILED:
+        raise ValueError('The %s algorithm has no delta phases to profile' % algorithm)
+    if budget is not None and algorithm not in BUDGETED:
+        raise ValueError('The %s algorithm cannot stop early within a budget' % algorithm)
+    if verbose is True:
+        log_level = logging.INFO
+    elif not verbose:
+        log_level = None
+    else:
+        log_level = verbose
+    options = {}
+    if profiler is not None:
+        options['profiler'] = profiler
+    if budget is not None:
+        options['budget'] = budget
+    start = time.time()
+    stats = ALGORITHMS[algorithm](network, log_level, warm_start, **options)
+    stats['seconds'] = time.time() - start
+    result = FlowResult(network, algorithm, stats)
+    if budget is not None:
+        add_gap(result, network)
+    return result
+
+def add_gap(result, network):
+    """
+    Add the dual bound, gap and relative gap of an anytime solve to its statistics. The bound is the better of the
+    one of the potentials when the scaling stopped and the one of the potentials after the rounding.
+    """
+    stats = result.stats
+    bounds = [bound for bound in (stats.get('dual_bound'), network.dual_bound()) if bound is not None]
+    if not stats['stopped']:
+        bounds.append(result.cost) #Optimal
+    bound = max(bounds) if bounds else None
+    stats['dual_bound'] = bound
+    stats['gap'] = None if bound is None else result.cost - bound
+    stats['relative_gap'] = None if bound is None else float(stats['gap']) / max(1, abs(result.cost))
+
+def resolve(network, supplies=None, costs=None, algorithm='orlin', verbose=False):
+    """
+    Re-solve a solved network after some node supplies or arc costs changed, starting from its optimal
+    flow and potentials: reduced costs are repaired around the changed arcs and only the new
+    imbalances are sent, so small changes take a fraction of a cold solve
+    @param network - ResidualNetwork solved before by solve or resolve
+    @param supplies - New supply of some nodes, {node name: supply}
+    @param costs - New cost of some input arcs, {arc index: cost}
+    """
+    start = time.time()
+    for name, supply in (supplies or {}).iteritems():
+        network.set_supply(network.index[name], supply)
+    for i, cost in (costs or {}).iteritems():
+        network.set_cost(i, cost)
+    network.repair_potentials(costs or ())
+    repair_seconds = time.time() - start
+    result = solve(network, algorithm, verbose, warm_start=True)
+    result.stats['seconds'] += repair_seconds
+    return result
+
+def solve_component(task):
+    """
+    Worker: solve the network of one component
+    @return (flows, potentials, stats) of the component
+    """
+    network, algorithm, verbose = task
+    result = solve(network, algorithm, verbose)
+    return result.flows, result.potentials, result.stats
+
+def solve_components(network, algorithm=AUTO, verbose=False, workers=None):
+    """
+    Solve every weakly connected component of the network on its own, on a pool of worker processes,
+    and merge the flows and potentials back into the network. Wall time then follows the largest
+    component instead of the whole network.
+    @param network - ResidualNetwork or input graph, as for solve
+    @param algorithm - As for solve, AUTO chooses for every component on its own
+    @param workers - Number of worker processes (the number of CPUs if None), 1 to solve the components in turn
+    @return FlowResult of the whole network, its statistics are the sums over the components
+    """
+    if algorithm not in ALGORITHMS and algorithm != AUTO:
+        raise ValueError('Unknown algorithm: %s' % algorithm)
+    if not isinstance(network, ResidualNetwork):
+        network = ResidualNetwork.from_graph(network)
+    start = time.time()
+    components = network.weak_components()
+    for nodes, arcs in components:
+        imbalance = sum(network.supply[v] for v in nodes)
+        if imbalance != 0:
+            raise InfeasibleError('Supplies of the component of node %s sum to %d instead of 0' % (network.names[nodes[0]], imbalance))
+    #Components without arcs have no flow to find (and a zero supply)
+    components = [(nodes, arcs) for nodes, arcs in components if len(arcs) > 0]
+    tasks = [(network.subnetwork(nodes, arcs), algorithm, verbose) for nodes, arcs in components]
+
+    network.reset()
+    if workers == 1 or len(tasks) <= 1:
+        solutions = map(solve_component, tasks)
+    else:
+        pool = multiprocessing.Pool(workers or multiprocessing.cpu_count())
+        try:
+            solutions = pool.map(solve_component, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    stats = {'components':len(components)}
+    for (nodes, arcs), (flows, potentials, component_stats) in zip(components, solutions):
+        network.set_flows(nodes, arcs, flows, potentials)
+        for key, value in component_stats.iteritems():
+            if key != 'seconds':
+                stats[key] = stats.get(key, 0) + value
+    stats['seconds'] = time.time() - start
+    return FlowResult(network, algorithm, stats)
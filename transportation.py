@@ -0,0 +1,308 @@
+"""
+Transportation simplex for networks whose arcs all go straight from a supply node to a demand node
+
+Costs are held in a dense supply x demand numpy matrix (pairs without an arc get a big-M cost), the
+first basis comes from Vogel's approximation method and the MODI (u-v) method then pivots until no cell
+has a negative reduced cost. Reduced costs of all the cells are computed at once on the matrix.
+Other networks, and sparse bipartite ones whose matrix would be much larger than their arc list,
+are handed over to the network simplex solver.
+"""
+import logging
+import numpy
+from residual import InfeasibleError, log, log_enabled, numpy_view
+from network_io import read_network, display_load_info
+from network_simplex import network_simplex_array
+
+DENSITY = 4 #Largest ratio of matrix cells to arcs of the dense path (small matrices always take it)
+SMALL_MATRIX = 1 << 16
+PRICING_CELLS = 1 << 14 #Cells of a block of rows priced at once
+
+def transportation_matrix(network):
+    """
+    Supply nodes (and zero supply nodes with arcs out), demand nodes (and zero supply nodes with arcs in) and
+    input arc of every supply-demand pair (the cheapest one of parallel arcs)
+    @return (sources, sinks, arcs) - arcs is a len(sources) x len(sinks) matrix, -1 for pairs without an arc
+    """
+    supply, tails, heads = numpy_view(network.supply), numpy_view(network.tail)[0::2], numpy_view(network.head)[0::2]
+    is_source, is_sink = supply > 0, supply < 0
+    is_source[tails] = True
+    is_sink[heads] = True
+    sources, sinks = numpy.flatnonzero(is_source), numpy.flatnonzero(is_sink)
+    row, col = numpy.zeros(network.n, dtype=numpy.int_), numpy.zeros(network.n, dtype=numpy.int_)
+    row[sources] = numpy.arange(len(sources))
+    col[sinks] = numpy.arange(len(sinks))
+    cells = row[tails]*len(sinks) + col[heads]
+    order = numpy.lexsort((numpy_view(network.cost)[0::2], cells))
+    first = numpy.r_[True, cells[order][1:] != cells[order][:-1]]
+    arcs = numpy.empty(len(sources)*len(sinks), dtype=numpy.int_)
+    arcs.fill(-1)
+    arcs[cells[order][first]] = order[first]
+    return sources, sinks, arcs.reshape(len(sources), len(sinks))
+
+class CheapestCells(object):
+    """
+    Two cheapest cells among the active columns of every row (or rows of every column, on the transposed
+    matrix), for the Vogel penalties. Columns are only ever crossed out, so the positions in the sorted
+    rows only move forward.
+    """
+
+    def __init__(self, cost, active):
+        self.cost = cost
+        self.order = numpy.argsort(cost, axis=1, kind='mergesort')
+        self.active = active
+        self.first = numpy.zeros(len(cost), dtype=numpy.int_) #Position of the cheapest active column in order
+        self.second = numpy.ones(len(cost), dtype=numpy.int_)
+        self.penalty = self.cost[numpy.arange(len(cost)), self.order[:, 1]] - self.cost[numpy.arange(len(cost)), self.order[:, 0]]
+
+    def cheapest(self, i):
+        return self.order[i, self.first[i]]
+
+    def refresh(self, i):
+        """
+        Move the two positions of row i past the crossed out columns, and update its penalty
+        """
+        order, active = self.order[i], self.active
+        first = self.first[i]
+        while not active[order[first]]:
+            first += 1
+        second = max(self.second[i], first + 1)
+        while not active[order[second]]:
+            second += 1
+        self.first[i], self.second[i] = first, second
+        self.penalty[i] = self.cost[i, order[second]] - self.cost[i, order[first]]
+
+    def crossed_out(self, j, rows):
+        """
+        Refresh the rows (among rows, a boolean mask) whose two cheapest columns include the crossed out column j
+        """
+        ends = numpy.arange(len(self.order))
+        for i in numpy.flatnonzero(rows & ((self.order[ends, self.first] == j) | (self.order[ends, self.second] == j))):
+            self.refresh(i)
+
+def vogel_start(cost, supply, demand):
+    """
+    Initial basic solution by Vogel's approximation method: the cheapest cell of the row or column with the
+    largest difference between its two cheapest cells gets as much as possible, then the row (or the column
+    if the row is not used up) is crossed out. A single remaining row or column takes all that is left.
+    @return Basic cells {(row, column): flow}, len(supply) + len(demand) - 1 of them
+    """
+    supply, demand = supply.copy(), demand.copy()
+    rows, cols = numpy.ones(len(supply), dtype=bool), numpy.ones(len(demand), dtype=bool)
+    row_count, col_count = len(supply), len(demand)
+    basis = {}
+    if row_count > 1 and col_count > 1:
+        by_row, by_col = CheapestCells(cost, cols), CheapestCells(cost.T, rows)
+    while row_count > 1 and col_count > 1:
+        row_penalty = numpy.where(rows, by_row.penalty, -1)
+        col_penalty = numpy.where(cols, by_col.penalty, -1)
+        r, c = numpy.argmax(row_penalty), numpy.argmax(col_penalty)
+        if row_penalty[r] >= col_penalty[c]:
+            i, j = r, by_row.cheapest(r)
+        else:
+            i, j = by_col.cheapest(c), c
+        amount = min(supply[i], demand[j])
+        basis[(i, j)] = amount
+        supply[i] -= amount
+        demand[j] -= amount
+        if supply[i] == 0:
+            rows[i] = False
+            row_count -= 1
+            if row_count > 1:
+                by_col.crossed_out(i, cols)
+        else:
+            cols[j] = False
+            col_count -= 1
+            if col_count > 1:
+                by_row.crossed_out(j, rows)
+    for i in numpy.flatnonzero(rows):
+        for j in numpy.flatnonzero(cols):
+            basis[(i, j)] = demand[j] if row_count == 1 else supply[i]
+    return basis
+
+class BasisTree(object):
+    """
+    Spanning tree of the basic cells, rooted at row 0: row i is node i and column j node rows+j.
+    potential holds u (rows) then v (columns), with u[i] + v[j] = cost[i, j] on every basic cell.
+    """
+
+    def __init__(self, cost, basis):
+        """
+        @param basis - Basic cells {(row, column): flow} of a spanning tree (see vogel_start)
+        """
+        rows, cols = cost.shape
+        self.rows = rows
+        neighbours = [[] for x in xrange(rows + cols)]
+        for i, j in basis:
+            neighbours[i].append(rows+j)
+            neighbours[rows+j].append(i)
+        self.parent = [-1]*(rows + cols)
+        self.depth = [0]*(rows + cols)
+        self.children = [set() for x in xrange(rows + cols)]
+        self.potential = numpy.zeros(rows + cols, dtype=numpy.int_)
+        order = [0]
+        for x in order:
+            for y in neighbours[x]:
+                if y != self.parent[x]:
+                    self.parent[y] = x
+                    self.depth[y] = self.depth[x] + 1
+                    self.children[x].add(y)
+                    self.potential[y] = cost[self.cell(x, y)] - self.potential[x]
+                    order.append(y)
+
+    def cell(self, x, y):
+        """
+        (row, column) cell of the tree arc between nodes x and y
+        """
+        return (x, y-self.rows) if x < self.rows else (y, x-self.rows)
+
+    def path(self, x, y):
+        """
+        Nodes of the tree path from x to y
+        """
+        parent, depth = self.parent, self.depth
+        up_x, up_y = [x], [y]
+        while x != y:
+            if depth[x] >= depth[y]:
+                x = parent[x]
+                up_x.append(x)
+            else:
+                y = parent[y]
+                up_y.append(y)
+        return up_x + up_y[-2::-1]
+
+    def pivot(self, row, col, reduced_cost, leaving):
+        """
+        Replace the tree arc from node leaving to its parent by the cell (row, col), whose reduced cost becomes 0.
+        The subtree of leaving is hung from the other end of the new cell and its potentials shift.
+        """
+        parent, children, depth = self.parent, self.children, self.depth
+        moved = [leaving]
+        for x in moved:
+            moved.extend(children[x])
+        moved_nodes = numpy.array(moved)
+        inside = set(moved)
+        if row in inside:
+            first, other, shift = row, self.rows+col, reduced_cost
+        else:
+            first, other, shift = self.rows+col, row, -reduced_cost
+        self.potential[moved_nodes[moved_nodes < self.rows]] += shift
+        self.potential[moved_nodes[moved_nodes >= self.rows]] -= shift
+
+        #Reverse the tree path from first up to leaving, first hangs from other by the new cell
+        path = [first]
+        while path[-1] != leaving:
+            path.append(parent[path[-1]])
+        for x in path:
+            children[parent[x]].discard(x)
+        new_parent = other
+        for x in path:
+            parent[x] = new_parent
+            children[new_parent].add(x)
+            new_parent = x
+
+        stack = [first]
+        depth[first] = depth[other] + 1
+        while stack:
+            x = stack.pop()
+            for y in children[x]:
+                depth[y] = depth[x] + 1
+                stack.append(y)
+
+def transportation_simplex_array(network, log_level=None, warm_start=False):
+    """
+    Transportation simplex (Vogel start, MODI pivots) on the array-backed residual network,
+    network simplex if the network is not a dense enough transportation problem
+    @param log_level - Lowest level of the messages to log (pivots are logged at DEBUG), None for no logging
+    @param warm_start - Only used by the network simplex fallback, the Vogel start is close to optimal anyway
+    @return Run statistics: number of pivots and degenerate pivots
+    """
+    if not network.is_transportation():
+        return network_simplex_array(network, log_level, warm_start)
+    sources, sinks, arcs = transportation_matrix(network)
+    if arcs.size > max(DENSITY*network.m, SMALL_MATRIX):
+        return network_simplex_array(network, log_level, warm_start)
+    network.reset()
+    log_pivots = log_enabled(log_level, logging.DEBUG)
+    if log_enabled(log_level, logging.INFO):
+        log.info('--transportation simplex on %d supply and %d demand nodes--', len(sources), len(sinks))
+    supply = numpy_view(network.supply)
+    if supply.sum() != 0:
+        raise InfeasibleError('Node excesses cannot be routed to node deficits')
+
+    #Cost matrix, pairs without an arc cost more than any cycle of real arcs
+    arc_costs = numpy_view(network.cost)[0::2]
+    big_m = (int(numpy.abs(arc_costs).max()) + 1)*(len(sources) + len(sinks))
+    cost = numpy.where(arcs >= 0, arc_costs[numpy.maximum(arcs, 0)], big_m)
+
+    basis = vogel_start(cost, supply[sources], -supply[sinks])
+    tree = BasisTree(cost, basis)
+    rows = len(sources)
+
+    stats = {'pivots':0, 'degenerate_pivots':0}
+    cols = len(sinks)
+    block = max(1, PRICING_CELLS // cols)
+    blocks = range(0, rows, block)
+    next_block = 0
+    while True:
+        #Block pricing: the most negative reduced cost of the first block of rows that has one
+        potential = tree.potential
+        entering = None
+        for step in xrange(len(blocks)):
+            low = blocks[(next_block + step) % len(blocks)]
+            high = min(rows, low + block)
+            reduced = cost[low:high] - potential[low:high, numpy.newaxis] - potential[numpy.newaxis, rows:]
+            k = numpy.argmin(reduced)
+            if reduced.flat[k] < 0:
+                entering = (low + k // cols, k % cols, reduced.flat[k])
+                next_block = (next_block + step + 1) % len(blocks)
+                break
+        if entering is None:
+            break
+        i, j, reduced_cost = entering
+
+        #Cycle of the entering cell: the path cells from row i to column j lose and gain flow in turn
+        path = tree.path(i, rows+j)
+        cells = [tree.cell(path[k], path[k+1]) for k in xrange(len(path)-1)]
+        k = min(xrange(0, len(cells), 2), key=lambda k: basis[cells[k]])
+        amount = basis[cells[k]]
+        for cell in cells[0::2]:
+            basis[cell] -= amount
+        for cell in cells[1::2]:
+            basis[cell] += amount
+        del basis[cells[k]]
+        basis[(i, j)] = amount
+        tree.pivot(i, j, reduced_cost, path[k] if tree.parent[path[k]] == path[k+1] else path[k+1])
+        stats['pivots'] += 1
+        if amount == 0:
+            stats['degenerate_pivots'] += 1
+        if log_pivots:
+            log.debug('Arc %s to %s enters the basis, %s unit(s)', network.names[sources[i]], network.names[sinks[j]], amount)
+
+    #Back to the network: flows of the basic cells and potentials from u and v
+    flows = numpy.zeros(network.m, dtype=numpy.int_)
+    for (i, j), amount in basis.iteritems():
+        if amount > 0:
+            if arcs[i, j] < 0:
+                raise InfeasibleError('Node excesses cannot be routed to node deficits')
+            flows[arcs[i, j]] = amount
+    potentials = numpy.zeros(network.n, dtype=numpy.int_)
+    potentials[sources] = tree.potential[:rows]
+    potentials[sinks] = -tree.potential[rows:]
+    network.set_flows(numpy.arange(network.n), numpy.arange(network.m), flows, potentials)
+    return stats
+
+def main():
+    logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
+    fn = raw_input('Input filename:')
+    try:
+        network, stats = read_network(fn)
+        display_load_info(stats)
+        stats = transportation_simplex_array(network, logging.DEBUG)
+        print 'Total cost: %s (%d pivots)' % (network.total_cost(), stats['pivots'])
+    except IOError:
+        print 'File not found.'
+    except ValueError as e:
+        print 'Invalid input: %s' % e
+
+if __name__ == '__main__':
+    main()